@@ -1,372 +1,886 @@
-import json
-import uuid
-import litellm
+import asyncio
 from loguru import logger
-from typing import Dict, Any, List, Callable, Coroutine, Literal
+from functools import cached_property
+from typing import (
+    Dict,
+    Any,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Callable,
+    Coroutine,
+    Literal,
+)
 
 from ..core.config import settings
+from ..core.cache import TTLCache, digest_key
 from .models import Agent, Tool
+from .llm import acompletion
+from .streaming import consume_tool_call_stream
+from .serialization import (
+    dumps_prompt_context,
+    dumps_tool_result,
+    loads_tool_arguments,
+    history_prompt_json,
+)
+from ..models.elements import ElementAdapter, ElementListAdapter, SolidFill
 from ..services.workspace_service import WorkspaceService
 
+# Tools that are not implemented by the agent itself but routed to other agents.
+_AGENT_ROUTED_TOOLS = frozenset({"invoke_agent"})
+# Tools that only read workspace state and are safe to fulfil alongside writes.
+_READ_ONLY_TOOLS = frozenset({"get_canvas_elements"})
+# Write tools whose results carry nothing the model needs for a follow-up step (no
+# new element IDs). A turn made only of these ends the task once they all succeed.
+_TERMINAL_TOOLS = frozenset(
+    {"update_element_properties", "update_elements", "reorder_elements"}
+)
+# Tool arguments that reference existing elements, at any nesting depth.
+_ELEMENT_ID_ARGUMENTS = frozenset(
+    {"element_id", "element_ids", "parentId", "parent_frame_id"}
+)
 
-class CanvasAgent(Agent):
-    """
-    An autonomous agent that creates, places, and modifies individual and compound
-    elements directly on the canvas. It is the primary "builder" agent for UI layouts,
-    interpreting precise instructions from higher-level agents like FrontendArchitect.
-    """
-
-    def __init__(self, workspace_service: WorkspaceService):
-        self._workspace = workspace_service
-
-    @property
-    def name(self) -> str:
-        return "CanvasAgent"
-
-    @property
-    def description(self) -> Dict[str, str]:
-        return {
-            "purpose": "Creates, places, and modifies individual elements (text, images, shapes, frames) and compound UI patterns (headers, sidebars, data cards) on the main canvas. It takes precise instructions and applies styling.",
-            "input": "A precise objective specifying the element to create or modify (type, content/source, dimensions, styling) and its exact coordinates (x, y). Can also accept parentId for nested elements.",
-            "output": "A set of commands to create or modify elements on the canvas, added to the workflow context.",
-            "limitations": "Cannot make autonomous design decisions or orchestrate multiple steps without explicit instructions. It executes, does not plan complex workflows.",
+# The tool schemas are static, so they are built once at import time and shared
+# by every CanvasAgent instance instead of being re-allocated on each access.
+_CANVAS_TOOLS: List[Tool] = [
+    # --- Individual Element Creation Tools (with more styling options) ---
+    Tool(
+        function={
+            "name": "create_shape",
+            "description": "Creates a styled geometric shape (rectangle or ellipse).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "shape_type": {
+                        "type": "string",
+                        "enum": ["rect", "ellipse"],
+                        "description": "The type of shape to create.",
+                    },
+                    "x": {"type": "number", "description": "The x-coordinate."},
+                    "y": {"type": "number", "description": "The y-coordinate."},
+                    "width": {
+                        "type": "number",
+                        "description": "The width of the shape.",
+                    },
+                    "height": {
+                        "type": "number",
+                        "description": "The height of the shape.",
+                    },
+                    "fill_color": {
+                        "type": "string",
+                        "description": "Hex color code for the fill (e.g., '#FFFFFF').",
+                    },
+                    "stroke_color": {
+                        "type": "string",
+                        "description": "Optional: Hex color code for the border.",
+                    },
+                    "stroke_width": {
+                        "type": "number",
+                        "description": "Optional: Width of the border.",
+                    },
+                    "corner_radius": {
+                        "type": "number",
+                        "description": "Optional: Radius for rounded corners (for rectangles).",
+                    },
+                    "parentId": {
+                        "type": "string",
+                        "description": "Optional: The ID of a parent frame to place this shape inside.",
+                    },
+                },
+                "required": [
+                    "shape_type",
+                    "x",
+                    "y",
+                    "width",
+                    "height",
+                    "fill_color",
+                ],
+            },
         }
-
-    @property
-    def tools(self) -> List[Tool]:
-        return [
-            # --- Individual Element Creation Tools (with more styling options) ---
-            Tool(
-                function={
-                    "name": "create_shape",
-                    "description": "Creates a styled geometric shape (rectangle or ellipse).",
-                    "parameters": {
+    ),
+    Tool(
+        function={
+            "name": "create_text_element",
+            "description": "Creates a styled text element on the canvas.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "content": {
+                        "type": "string",
+                        "description": "The text content of the element.",
+                    },
+                    "x": {"type": "number"},
+                    "y": {"type": "number"},
+                    "width": {"type": "number"},
+                    "height": {"type": "number"},
+                    "fontSize": {
+                        "type": "number",
+                        "description": "Font size in pixels.",
+                    },
+                    "fontColor": {
+                        "type": "string",
+                        "description": "Hex color code for the text.",
+                    },
+                    "fontWeight": {
+                        "type": "number",
+                        "description": "Font weight (e.g., 400 for regular, 700 for bold).",
+                    },
+                    "textAlign": {
+                        "type": "string",
+                        "enum": ["left", "center", "right"],
+                        "description": "Horizontal text alignment.",
+                    },
+                    "parentId": {
+                        "type": "string",
+                        "description": "Optional: The ID of a parent frame to place this text inside.",
+                    },
+                },
+                "required": ["content", "x", "y", "width", "height"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_image_element",
+            "description": "Creates an image element on the canvas at a specific location using a provided URL.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "image_url": {
+                        "type": "string",
+                        "description": "The URL of the image to display.",
+                    },
+                    "x": {"type": "number"},
+                    "y": {"type": "number"},
+                    "width": {"type": "number"},
+                    "height": {"type": "number"},
+                    "alt_text": {
+                        "type": "string",
+                        "description": "Alternative text for the image.",
+                    },
+                    "parentId": {
+                        "type": "string",
+                        "description": "Optional: The ID of a parent frame to place this image inside.",
+                    },
+                },
+                "required": ["image_url", "x", "y", "width", "height"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "update_element_properties",
+            "description": "Updates properties of an existing element on the canvas, identified by its ID.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "element_id": {
+                        "type": "string",
+                        "description": "The ID of the element to modify.",
+                    },
+                    "updates": {
                         "type": "object",
-                        "properties": {
-                            "shape_type": {
-                                "type": "string",
-                                "enum": ["rect", "ellipse"],
-                                "description": "The type of shape to create.",
-                            },
-                            "x": {"type": "number", "description": "The x-coordinate."},
-                            "y": {"type": "number", "description": "The y-coordinate."},
-                            "width": {
-                                "type": "number",
-                                "description": "The width of the shape.",
-                            },
-                            "height": {
-                                "type": "number",
-                                "description": "The height of the shape.",
-                            },
-                            "fill_color": {
-                                "type": "string",
-                                "description": "Hex color code for the fill (e.g., '#FFFFFF').",
-                            },
-                            "stroke_color": {
-                                "type": "string",
-                                "description": "Optional: Hex color code for the border.",
-                            },
-                            "stroke_width": {
-                                "type": "number",
-                                "description": "Optional: Width of the border.",
-                            },
-                            "corner_radius": {
-                                "type": "number",
-                                "description": "Optional: Radius for rounded corners (for rectangles).",
-                            },
-                            "parentId": {
-                                "type": "string",
-                                "description": "Optional: The ID of a parent frame to place this shape inside.",
+                        "description": "A dictionary of properties to update, e.g., {'fill': {'type': 'solid', 'color': '#0000FF'}}.",
+                    },
+                },
+                "required": ["element_id", "updates"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "update_elements",
+            "description": "Updates properties of several existing elements in a single step. Prefer this over repeated update_element_properties calls when changing more than one element.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "updates": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "element_id": {
+                                    "type": "string",
+                                    "description": "The ID of the element to modify.",
+                                },
+                                "updates": {
+                                    "type": "object",
+                                    "description": "A dictionary of properties to update for this element.",
+                                },
                             },
+                            "required": ["element_id", "updates"],
                         },
-                        "required": [
-                            "shape_type",
-                            "x",
-                            "y",
-                            "width",
-                            "height",
-                            "fill_color",
+                        "description": "The list of element updates to apply.",
+                    },
+                },
+                "required": ["updates"],
+            },
+        }
+    ),
+    # --- Structural/Compound UI Element Tools ---
+    Tool(
+        function={
+            "name": "reorder_elements",
+            "description": "Changes the stacking order (z-index) of one or more elements in a single operation. Use this instead of reordering elements one at a time.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "element_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "IDs of the elements to reorder. Their relative order is preserved.",
+                    },
+                    "command": {
+                        "type": "string",
+                        "enum": [
+                            "BRING_FORWARD",
+                            "SEND_BACKWARD",
+                            "BRING_TO_FRONT",
+                            "SEND_TO_BACK",
                         ],
                     },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_text_element",
-                    "description": "Creates a styled text element on the canvas.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "content": {
-                                "type": "string",
-                                "description": "The text content of the element.",
-                            },
-                            "x": {"type": "number"},
-                            "y": {"type": "number"},
-                            "width": {"type": "number"},
-                            "height": {"type": "number"},
-                            "fontSize": {
-                                "type": "number",
-                                "description": "Font size in pixels.",
-                            },
-                            "fontColor": {
-                                "type": "string",
-                                "description": "Hex color code for the text.",
-                            },
-                            "fontWeight": {
-                                "type": "number",
-                                "description": "Font weight (e.g., 400 for regular, 700 for bold).",
-                            },
-                            "textAlign": {
-                                "type": "string",
-                                "enum": ["left", "center", "right"],
-                                "description": "Horizontal text alignment.",
-                            },
-                            "parentId": {
-                                "type": "string",
-                                "description": "Optional: The ID of a parent frame to place this text inside.",
-                            },
-                        },
-                        "required": ["content", "x", "y", "width", "height"],
+                },
+                "required": ["element_ids", "command"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_frame",
+            "description": "Creates an empty, structural container (a frame) on the canvas for organizing UI sections.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "A descriptive name for the frame (e.g., 'Sidebar', 'Main Content').",
                     },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_image_element",
-                    "description": "Creates an image element on the canvas at a specific location using a provided URL.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "image_url": {
-                                "type": "string",
-                                "description": "The URL of the image to display.",
-                            },
-                            "x": {"type": "number"},
-                            "y": {"type": "number"},
-                            "width": {"type": "number"},
-                            "height": {"type": "number"},
-                            "alt_text": {
-                                "type": "string",
-                                "description": "Alternative text for the image.",
-                            },
-                            "parentId": {
-                                "type": "string",
-                                "description": "Optional: The ID of a parent frame to place this image inside.",
-                            },
-                        },
-                        "required": ["image_url", "x", "y", "width", "height"],
+                    "x": {"type": "number"},
+                    "y": {"type": "number"},
+                    "width": {"type": "number"},
+                    "height": {"type": "number"},
+                    "fill_color": {
+                        "type": "string",
+                        "description": "Optional: Background color of the frame.",
                     },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "update_element_properties",
-                    "description": "Updates properties of an existing element on the canvas, identified by its ID.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "element_id": {
-                                "type": "string",
-                                "description": "The ID of the element to modify.",
-                            },
-                            "updates": {
-                                "type": "object",
-                                "description": "A dictionary of properties to update, e.g., {'fill': {'type': 'solid', 'color': '#0000FF'}}.",
-                            },
-                        },
-                        "required": ["element_id", "updates"],
+                    "stroke_color": {
+                        "type": "string",
+                        "description": "Optional: Border color of the frame.",
                     },
-                }
-            ),
-            # --- Structural/Compound UI Element Tools ---
-            Tool(
-                function={
-                    "name": "create_frame",
-                    "description": "Creates an empty, structural container (a frame) on the canvas for organizing UI sections.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "name": {
-                                "type": "string",
-                                "description": "A descriptive name for the frame (e.g., 'Sidebar', 'Main Content').",
-                            },
-                            "x": {"type": "number"},
-                            "y": {"type": "number"},
-                            "width": {"type": "number"},
-                            "height": {"type": "number"},
-                            "fill_color": {
-                                "type": "string",
-                                "description": "Optional: Background color of the frame.",
-                            },
-                            "stroke_color": {
-                                "type": "string",
-                                "description": "Optional: Border color of the frame.",
-                            },
-                            "stroke_width": {
-                                "type": "number",
-                                "description": "Optional: Border width.",
-                            },
-                            "corner_radius": {
-                                "type": "number",
-                                "description": "Optional: Radius for rounded corners.",
-                            },
-                            "parentId": {
-                                "type": "string",
-                                "description": "Optional: ID of a parent frame to place this frame within.",
-                            },
-                        },
-                        "required": ["name", "x", "y", "width", "height"],
+                    "stroke_width": {
+                        "type": "number",
+                        "description": "Optional: Border width.",
                     },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_header_bar",
-                    "description": "Creates a standard header bar for a UI screen, including a logo placeholder and navigation links, within a parent frame.",
-                    "parameters": {
+                    "corner_radius": {
+                        "type": "number",
+                        "description": "Optional: Radius for rounded corners.",
+                    },
+                    "parentId": {
+                        "type": "string",
+                        "description": "Optional: ID of a parent frame to place this frame within.",
+                    },
+                },
+                "required": ["name", "x", "y", "width", "height"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_header_bar",
+            "description": "Creates a standard header bar for a UI screen, including a logo placeholder and navigation links, within a parent frame.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "parent_frame_id": {
+                        "type": "string",
+                        "description": "The ID of the main frame to place the header within.",
+                    },
+                    "height": {
+                        "type": "number",
+                        "description": "The height of the header bar.",
+                    },
+                    "logo_text": {
+                        "type": "string",
+                        "description": "The text for the logo (e.g., 'Parsec').",
+                    },
+                    "nav_links": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "List of navigation link texts (e.g., ['Dashboard', 'Analytics']).",
+                    },
+                },
+                "required": [
+                    "parent_frame_id",
+                    "height",
+                    "logo_text",
+                    "nav_links",
+                ],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_sidebar_layout",
+            "description": "Creates a standard sidebar for navigation (left or right) within a parent frame.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "parent_frame_id": {
+                        "type": "string",
+                        "description": "The ID of the main frame to place the sidebar within.",
+                    },
+                    "width": {
+                        "type": "number",
+                        "description": "The width of the sidebar.",
+                    },
+                    "position": {
+                        "type": "string",
+                        "enum": ["left", "right"],
+                        "description": "Position of the sidebar ('left' or 'right').",
+                    },
+                    "nav_items": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "List of navigation item texts (e.g., ['Home', 'Profile', 'Settings']).",
+                    },
+                },
+                "required": [
+                    "parent_frame_id",
+                    "width",
+                    "position",
+                    "nav_items",
+                ],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_data_card",
+            "description": "Creates a visually distinct card for displaying key metrics or summaries, within a parent frame.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "parent_frame_id": {
+                        "type": "string",
+                        "description": "The ID of the frame to place the card within.",
+                    },
+                    "x": {"type": "number"},
+                    "y": {"type": "number"},
+                    "width": {"type": "number"},
+                    "height": {"type": "number"},
+                    "title": {
+                        "type": "string",
+                        "description": "Main title of the card.",
+                    },
+                    "value": {
+                        "type": "string",
+                        "description": "Primary value or metric on the card.",
+                    },
+                    "subtitle": {
+                        "type": "string",
+                        "description": "Optional: secondary value or unit.",
+                    },
+                },
+                "required": [
+                    "parent_frame_id",
+                    "x",
+                    "y",
+                    "width",
+                    "height",
+                    "title",
+                    "value",
+                ],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_dashboard_layout",
+            "description": "Creates a header bar, a sidebar and/or several data cards inside one frame in a single step. Prefer it over separate create_header_bar, create_sidebar_layout and create_data_card calls when building more than one of them.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "parent_frame_id": {
+                        "type": "string",
+                        "description": "The ID of the main frame to build the dashboard in.",
+                    },
+                    "header": {
                         "type": "object",
+                        "description": "Optional: the header bar, as for create_header_bar.",
                         "properties": {
-                            "parent_frame_id": {
-                                "type": "string",
-                                "description": "The ID of the main frame to place the header within.",
-                            },
-                            "height": {
-                                "type": "number",
-                                "description": "The height of the header bar.",
-                            },
-                            "logo_text": {
-                                "type": "string",
-                                "description": "The text for the logo (e.g., 'Parsec').",
-                            },
+                            "height": {"type": "number"},
+                            "logo_text": {"type": "string"},
                             "nav_links": {
                                 "type": "array",
                                 "items": {"type": "string"},
-                                "description": "List of navigation link texts (e.g., ['Dashboard', 'Analytics']).",
                             },
                         },
-                        "required": [
-                            "parent_frame_id",
-                            "height",
-                            "logo_text",
-                            "nav_links",
-                        ],
+                        "required": ["height", "logo_text", "nav_links"],
                     },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_sidebar_layout",
-                    "description": "Creates a standard sidebar for navigation (left or right) within a parent frame.",
-                    "parameters": {
+                    "sidebar": {
                         "type": "object",
+                        "description": "Optional: the sidebar, as for create_sidebar_layout.",
                         "properties": {
-                            "parent_frame_id": {
-                                "type": "string",
-                                "description": "The ID of the main frame to place the sidebar within.",
-                            },
-                            "width": {
-                                "type": "number",
-                                "description": "The width of the sidebar.",
-                            },
-                            "position": {
-                                "type": "string",
-                                "enum": ["left", "right"],
-                                "description": "Position of the sidebar ('left' or 'right').",
-                            },
+                            "width": {"type": "number"},
+                            "position": {"type": "string", "enum": ["left", "right"]},
                             "nav_items": {
                                 "type": "array",
                                 "items": {"type": "string"},
-                                "description": "List of navigation item texts (e.g., ['Home', 'Profile', 'Settings']).",
                             },
                         },
-                        "required": [
-                            "parent_frame_id",
-                            "width",
-                            "position",
-                            "nav_items",
-                        ],
+                        "required": ["width", "position", "nav_items"],
                     },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_data_card",
-                    "description": "Creates a visually distinct card for displaying key metrics or summaries, within a parent frame.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "parent_frame_id": {
-                                "type": "string",
-                                "description": "The ID of the frame to place the card within.",
-                            },
-                            "x": {"type": "number"},
-                            "y": {"type": "number"},
-                            "width": {"type": "number"},
-                            "height": {"type": "number"},
-                            "title": {
-                                "type": "string",
-                                "description": "Main title of the card.",
-                            },
-                            "value": {
-                                "type": "string",
-                                "description": "Primary value or metric on the card.",
-                            },
-                            "subtitle": {
-                                "type": "string",
-                                "description": "Optional: secondary value or unit.",
+                    "cards": {
+                        "type": "array",
+                        "description": "Optional: data cards, as for create_data_card.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "x": {"type": "number"},
+                                "y": {"type": "number"},
+                                "width": {"type": "number"},
+                                "height": {"type": "number"},
+                                "title": {"type": "string"},
+                                "value": {"type": "string"},
+                                "subtitle": {"type": "string"},
                             },
+                            "required": [
+                                "x",
+                                "y",
+                                "width",
+                                "height",
+                                "title",
+                                "value",
+                            ],
                         },
-                        "required": [
-                            "parent_frame_id",
-                            "x",
-                            "y",
-                            "width",
-                            "height",
-                            "title",
-                            "value",
-                        ],
                     },
-                }
-            ),
-            # --- Inter-Agent Communication Tool ---
-            Tool(
-                function={
-                    "name": "invoke_agent",
-                    "description": "Calls another specialist agent to get information, like text from ContentCrafter or an image URL from ImageGenius.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "agent_name": {
-                                "type": "string",
-                                "enum": ["ContentCrafter", "ImageGenius"],
-                            },
-                            "objective": {
-                                "type": "string",
-                                "description": "The high-level objective to give to the other agent.",
-                            },
-                        },
-                        "required": ["agent_name", "objective"],
+                },
+                "required": ["parent_frame_id"],
+            },
+        }
+    ),
+    # --- Canvas Inspection Tool ---
+    Tool(
+        function={
+            "name": "get_canvas_elements",
+            "description": "Returns every element currently on the canvas (IDs, types, positions, sizes, styling and parentIds). Use it to find existing elements to modify or to place new elements relative to.",
+            "parameters": {"type": "object", "properties": {}},
+        }
+    ),
+    # --- Inter-Agent Communication Tool ---
+    Tool(
+        function={
+            "name": "invoke_agent",
+            "description": "Calls another specialist agent to get information, like text from ContentCrafter or an image URL from ImageGenius.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "agent_name": {
+                        "type": "string",
+                        "enum": ["ContentCrafter", "ImageGenius"],
                     },
-                }
-            ),
-        ]
+                    "objective": {
+                        "type": "string",
+                        "description": "The high-level objective to give to the other agent.",
+                    },
+                },
+                "required": ["agent_name", "objective"],
+            },
+        }
+    ),
+]
 
-    @property
-    def available_functions(self) -> Dict[str, Callable]:
+# Dumped form of the tool schemas, sent with every completion request. Serializing
+# them once avoids re-dumping on every LLM turn.
+_CANVAS_TOOL_SCHEMAS: List[Dict[str, Any]] = [t.model_dump() for t in _CANVAS_TOOLS]
+# Schemas offered after the first turn. Content from other agents is fetched up front
+# (see rule 2 of the system prompt), so later turns do without `invoke_agent`.
+_CANVAS_FOLLOW_UP_TOOL_SCHEMAS: List[Dict[str, Any]] = [
+    schema
+    for schema in _CANVAS_TOOL_SCHEMAS
+    if schema["function"]["name"] not in _AGENT_ROUTED_TOOLS
+]
+# The full schemas already travel in `tools=`, so the system prompt only carries a
+# one-line summary per tool instead of repeating every parameter definition.
+_CANVAS_TOOL_SUMMARIES = "\n        ".join(
+    f"- `{t.function['name']}`: {t.function['description']}" for t in _CANVAS_TOOLS
+)
+
+
+# Required and accepted argument names per tool, taken from the schemas, so malformed
+# calls can be answered with a precise error instead of a TypeError from the call.
+_CANVAS_TOOL_PARAMETERS: Dict[str, Tuple[frozenset, frozenset]] = {
+    t.function["name"]: (
+        frozenset(t.function["parameters"].get("required", ())),
+        frozenset(t.function["parameters"].get("properties", {})),
+    )
+    for t in _CANVAS_TOOLS
+}
+
+
+def _tool_arguments_error(tool_name: str, tool_args: Any) -> Optional[str]:
+    """Checks parsed tool arguments against the tool's schema."""
+    if not isinstance(tool_args, dict):
+        return f"Arguments for '{tool_name}' must be a JSON object."
+    parameters = _CANVAS_TOOL_PARAMETERS.get(tool_name)
+    if parameters is None:
+        return None
+    required, accepted = parameters
+    missing = required - tool_args.keys()
+    if missing:
+        return f"Missing required arguments for '{tool_name}': {', '.join(sorted(missing))}."
+    unexpected = tool_args.keys() - accepted
+    if unexpected:
+        return f"Unknown arguments for '{tool_name}': {', '.join(sorted(unexpected))}."
+    return None
+
+
+def _tool_call_signature(
+    tool_calls: List[Dict[str, Any]],
+) -> Tuple[Tuple[str, str], ...]:
+    """Identifies a sequence of tool calls by their names and raw arguments."""
+    return tuple(
+        (tool_call["function"]["name"], tool_call["function"]["arguments"])
+        for tool_call in tool_calls
+    )
+
+
+def _referenced_element_ids(arguments: Any) -> Iterator[str]:
+    """Yields the IDs of the existing elements that a tool call's arguments target."""
+    if isinstance(arguments, dict):
+        for key, value in arguments.items():
+            if key in _ELEMENT_ID_ARGUMENTS:
+                if isinstance(value, str):
+                    yield value
+                elif isinstance(value, list):
+                    yield from (v for v in value if isinstance(v, str))
+            else:
+                yield from _referenced_element_ids(value)
+    elif isinstance(arguments, list):
+        for item in arguments:
+            yield from _referenced_element_ids(item)
+
+
+def _solid_fill(color: str, trusted: bool) -> Any:
+    """
+    A solid fill for a tool-built element payload. Pydantic does not revalidate model
+    instances, so the fill stays a plain dict (validated along with the element)
+    unless the tool arguments are trusted and the element is built unvalidated.
+    """
+    if trusted:
+        return SolidFill.model_construct(color=color)
+    return {"type": "solid", "color": color}
+
+
+def _supports_cache_control(model: str) -> bool:
+    """Whether the model's provider takes explicit `cache_control` prompt markers."""
+    return model.startswith(("anthropic/", "claude")) or "/claude" in model
+
+
+# Element payload templates for the compound builders (header bar, sidebar, data card).
+# Each builder copies a template and only sets the fields that vary per call. The
+# fills are shared between payloads and must never be mutated.
+_PANEL_FILL = SolidFill(color="#222222")
+_SIDEBAR_FILL = SolidFill(color="#2A2A2A")
+
+_HEADER_BG_TEMPLATE: Dict[str, Any] = {
+    "element_type": "shape",
+    "shape_type": "rect",
+    "x": 0,
+    "y": 0,
+    "fill": _PANEL_FILL,
+}
+_HEADER_LOGO_TEMPLATE: Dict[str, Any] = {
+    "element_type": "text",
+    "x": 20,
+    "width": 150,
+    "height": 24,
+    "fontSize": 20,
+    "fontWeight": 700,
+    "fontColor": "#007AFF",  # Accent color
+}
+_NAV_LINK_TEMPLATE: Dict[str, Any] = {
+    "element_type": "text",
+    "width": 80,
+    "height": 16,
+    "fontSize": 14,
+    "fontColor": "#B0B0B0",
+    "textAlign": "center",
+}
+_SIDEBAR_BG_TEMPLATE: Dict[str, Any] = {
+    "element_type": "shape",
+    "shape_type": "rect",
+    "y": 0,
+    "fill": _SIDEBAR_FILL,
+}
+_SIDEBAR_ITEM_TEMPLATE: Dict[str, Any] = {
+    "element_type": "text",
+    "height": 24,
+    "fontSize": 16,
+    "fontColor": "#FFFFFF",
+    "fontWeight": 400,
+}
+_CARD_BG_TEMPLATE: Dict[str, Any] = {
+    "element_type": "shape",
+    "shape_type": "rect",
+    "fill": _PANEL_FILL,
+    "cornerRadius": 8,
+}
+_CARD_TITLE_TEMPLATE: Dict[str, Any] = {
+    "element_type": "text",
+    "height": 20,
+    "fontSize": 16,
+    "fontColor": "#B0B0B0",
+}
+_CARD_VALUE_TEMPLATE: Dict[str, Any] = {
+    "element_type": "text",
+    "height": 30,
+    "fontSize": 28,
+    "fontWeight": 700,
+    "fontColor": "#FFFFFF",
+}
+_CARD_SUBTITLE_TEMPLATE: Dict[str, Any] = {
+    "element_type": "text",
+    "height": 16,
+    "fontSize": 14,
+    "fontColor": "#888888",
+}
+
+
+def _from_template(template: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+    """Returns a copy of an element payload template with `fields` set on it."""
+    payload = template.copy()
+    payload.update(fields)
+    return payload
+
+
+def _header_bar_payloads(
+    frame: Any, height: float, logo_text: str, nav_links: List[str]
+) -> List[Dict[str, Any]]:
+    """Element payloads of a header bar across the top of `frame`."""
+    parent_frame_id = frame.id
+    # The element count is known up front, so the list is allocated at its final
+    # size: background, logo, then one text element per navigation link.
+    payloads = [None] * (2 + len(nav_links))
+    # Background rectangle for the header
+    payloads[0] = _from_template(
+        _HEADER_BG_TEMPLATE,
+        parentId=parent_frame_id,
+        width=frame.width,
+        height=height,
+    )
+    # Logo text
+    payloads[1] = _from_template(
+        _HEADER_LOGO_TEMPLATE,
+        parentId=parent_frame_id,
+        content=logo_text,
+        y=height / 2 - 12,
+    )
+    # Navigation links, right aligned and spaced 100px apart
+    base_x = frame.width - 20 - (len(nav_links) * 100)
+    link_y = height / 2 - 8
+    for i, link_text in enumerate(nav_links):
+        payloads[2 + i] = _from_template(
+            _NAV_LINK_TEMPLATE,
+            parentId=parent_frame_id,
+            content=link_text,
+            x=base_x + i * 100,
+            y=link_y,
+        )
+    return payloads
+
+
+def _sidebar_payloads(
+    frame: Any, width: float, position: str, nav_items: List[str]
+) -> List[Dict[str, Any]]:
+    """Element payloads of a full-height navigation sidebar on one side of `frame`."""
+    parent_frame_id = frame.id
+    sidebar_x = 0 if position == "left" else frame.width - width
+    # Allocated at its final size: background, then one text element per item.
+    payloads = [None] * (1 + len(nav_items))
+    # Background for sidebar
+    payloads[0] = _from_template(
+        _SIDEBAR_BG_TEMPLATE,
+        parentId=parent_frame_id,
+        x=sidebar_x,
+        width=width,
+        height=frame.height,
+    )
+    # Navigation items, starting below a potential header and spaced 40px apart
+    item_x = sidebar_x + 20
+    item_width = width - 40
+    for i, item_text in enumerate(nav_items):
+        payloads[1 + i] = _from_template(
+            _SIDEBAR_ITEM_TEMPLATE,
+            parentId=parent_frame_id,
+            content=item_text,
+            x=item_x,
+            y=60 + i * 40,
+            width=item_width,
+        )
+    return payloads
+
+
+def _data_card_payloads(
+    parent_frame_id: str,
+    x: float,
+    y: float,
+    width: float,
+    height: float,
+    title: str,
+    value: str,
+    subtitle: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Element payloads of a metric card: background, title, value and subtitle."""
+    # Allocated at its final size: background, title, value and optional subtitle.
+    payloads = [None] * (4 if subtitle else 3)
+    # Card background
+    payloads[0] = _from_template(
+        _CARD_BG_TEMPLATE,
+        parentId=parent_frame_id,
+        x=x,
+        y=y,
+        width=width,
+        height=height,
+    )
+    # Title
+    payloads[1] = _from_template(
+        _CARD_TITLE_TEMPLATE,
+        parentId=parent_frame_id,
+        content=title,
+        x=x + 20,
+        y=y + 20,
+        width=width - 40,
+    )
+    # Value
+    payloads[2] = _from_template(
+        _CARD_VALUE_TEMPLATE,
+        parentId=parent_frame_id,
+        content=value,
+        x=x + 20,
+        y=y + 45,
+        width=width - 40,
+    )
+    # Subtitle
+    if subtitle:
+        payloads[3] = _from_template(
+            _CARD_SUBTITLE_TEMPLATE,
+            parentId=parent_frame_id,
+            content=subtitle,
+            x=x + 20,
+            y=y + 80,
+            width=width - 40,
+        )
+    return payloads
+
+
+class CanvasAgent(Agent):
+    """
+    An autonomous agent that creates, places, and modifies individual and compound
+    elements directly on the canvas. It is the primary "builder" agent for UI layouts,
+    interpreting precise instructions from higher-level agents like FrontendArchitect.
+    """
+
+    # The rules and tool definitions never change, so this part of the system prompt
+    # is formatted once when the class is created. Only the context varies per task.
+    _SYSTEM_PROMPT_PREAMBLE = f"""
+        You are an expert canvas builder and element manipulator. Your task is to interpret a precise objective and execute it by calling the most appropriate tool with the correct parameters.
+
+        **CRITICAL RULES:**
+        1.  **Tool Selection:** Choose ONE tool from the list that best matches the objective.
+        2.  **Parameter Extraction:** Extract ALL required parameters precisely from the objective. If the objective is missing information but you can get it from another agent (like text from ContentCrafter or an image URL from ImageGenius), use the `invoke_agent` tool first.
+        3.  **Default Values:** If numerical parameters (like x, y, width, height, fontSize, corner_radius, etc.) are NOT explicitly specified in the objective or derivable from context, you MUST infer reasonable, aesthetically pleasing default values.
+        4.  **Styling:** For `create_shape`, `create_text_element`, `create_frame`, `create_header_bar`, `create_sidebar_layout`, and `create_data_card`, you MUST apply styling parameters (like `fill_color`, `fontColor`, `fontWeight`, `corner_radius`, `stroke_color`, `stroke_width`) to match a modern, dark UI aesthetic.
+        5.  **Parenting:** If an element is to be placed inside a frame, you MUST include the `parentId` parameter with the frame's ID.
+        6.  **Output:** Respond ONLY with the tool call JSON.
+        7.  **Reading the Canvas:** You may call `get_canvas_elements` in the same response as a write tool. The read is fulfilled locally and the write calls are treated as final.
+
+        **Available Tools:**
+        {_CANVAS_TOOL_SUMMARIES}
+        """
+
+    # The per-task tail of the system prompt. Kept separate from the preamble so the
+    # tool summaries never go through str.format.
+    _SYSTEM_PROMPT_CONTEXT = """
+        **Contextual Information:**
+        - Selected element IDs: {selected_ids}
+        - Workflow History (for previous results/element IDs): {history}
+        """
+
+    def __init__(self, workspace_service: WorkspaceService):
+        self._workspace = workspace_service
+        self._workspace_lock = asyncio.Lock()
+        self._agent_invocation_slots = asyncio.Semaphore(
+            settings.MAX_CONCURRENT_AGENT_INVOCATIONS
+        )
+        # Completion parameters that stay the same for every LLM turn of this agent.
+        self._llm_kwargs: Dict[str, Any] = {
+            "model": settings.LITELLM_TEXT_MODEL,
+            "tool_choice": "auto",
+            "temperature": 0.0,
+            "api_key": settings.AZURE_API_KEY_TEXT,
+            "api_base": settings.AZURE_API_BASE_TEXT,
+            "api_version": settings.AZURE_API_VERSION_TEXT,
+            "stream": True,
+        }
+        # Azure/OpenAI cache byte-identical prefixes automatically; Anthropic models
+        # need the static block marked explicitly to be cached.
+        preamble: Any = self._SYSTEM_PROMPT_PREAMBLE
+        if _supports_cache_control(settings.LITELLM_TEXT_MODEL):
+            preamble = [
+                {
+                    "type": "text",
+                    "text": preamble,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
+        self._preamble_content = preamble
+        # Task digest -> (expiry, tool calls) of plans that completed in one tool turn.
+        self._plan_cache: TTLCache[Tuple[Tuple[str, str], ...]] = TTLCache(
+            settings.CANVAS_PLAN_CACHE_SIZE, settings.CANVAS_PLAN_CACHE_TTL_SECONDS
+        )
+        # (workspace revision, serialized elements) of the last canvas snapshot.
+        self._canvas_snapshot: Optional[Tuple[int, str]] = None
         # Map tool names to their actual implementations within this agent.
-        return {
+        # Built once per instance so tool dispatch is a single dict lookup.
+        self._dispatch: Dict[str, Callable] = {
             "create_shape": self._create_shape,
             "create_text_element": self._create_text_element,
             "create_image_element": self._create_image_element,
             "update_element_properties": self._update_element_properties,
+            "update_elements": self._update_elements,
+            "reorder_elements": self._reorder_elements,
             "create_frame": self._create_frame,
             "create_header_bar": self._create_header_bar,
             "create_sidebar_layout": self._create_sidebar_layout,
             "create_data_card": self._create_data_card,
-            # invoke_agent is handled specially in run_task
+            "create_dashboard_layout": self._create_dashboard_layout,
+            "get_canvas_elements": self._get_canvas_elements,
+            # invoke_agent is handled specially, see _AGENT_ROUTED_TOOLS
+        }
+
+    @property
+    def name(self) -> str:
+        return "CanvasAgent"
+
+    @cached_property
+    def description(self) -> Dict[str, str]:
+        return {
+            "purpose": "Creates, places, and modifies individual elements (text, images, shapes, frames) and compound UI patterns (headers, sidebars, data cards) on the main canvas. It takes precise instructions and applies styling.",
+            "input": "A precise objective specifying the element to create or modify (type, content/source, dimensions, styling) and its exact coordinates (x, y). Can also accept parentId for nested elements.",
+            "output": "A set of commands to create or modify elements on the canvas, added to the workflow context.",
+            "limitations": "Cannot make autonomous design decisions or orchestrate multiple steps without explicit instructions. It executes, does not plan complex workflows.",
         }
 
+    @property
+    def tools(self) -> List[Tool]:
+        return _CANVAS_TOOLS
+
+    @property
+    def available_functions(self) -> Dict[str, Callable]:
+        return self._dispatch
+
     async def run_task(
         self,
         objective: str,
@@ -379,32 +893,45 @@ class CanvasAgent(Agent):
         then uses the LLM to select the appropriate tool and arguments.
         It can also invoke other agents if it needs content.
         """
-        logger.info(f"Agent '{self.name}' activated with objective: '{objective}'")
+        # Lazy loguru formatting: the arguments are only rendered if INFO is enabled.
+        logger.info("Agent '{}' activated with objective: '{}'", self.name, objective)
 
-        system_prompt = f"""
-        You are an expert canvas builder and element manipulator. Your task is to interpret a precise objective and execute it by calling the most appropriate tool with the correct parameters.
-
-        **CRITICAL RULES:**
-        1.  **Tool Selection:** Choose ONE tool from the list that best matches the objective.
-        2.  **Parameter Extraction:** Extract ALL required parameters precisely from the objective. If the objective is missing information but you can get it from another agent (like text from ContentCrafter or an image URL from ImageGenius), use the `invoke_agent` tool first.
-        3.  **Default Values:** If numerical parameters (like x, y, width, height, fontSize, corner_radius, etc.) are NOT explicitly specified in the objective or derivable from context, you MUST infer reasonable, aesthetically pleasing default values.
-        4.  **Styling:** For `create_shape`, `create_text_element`, `create_frame`, `create_header_bar`, `create_sidebar_layout`, and `create_data_card`, you MUST apply styling parameters (like `fill_color`, `fontColor`, `fontWeight`, `corner_radius`, `stroke_color`, `stroke_width`) to match a modern, dark UI aesthetic.
-        5.  **Parenting:** If an element is to be placed inside a frame, you MUST include the `parentId` parameter with the frame's ID.
-        6.  **Output:** Respond ONLY with the tool call JSON.
+        selected_ids_json = dumps_prompt_context(context.get("selected_ids", []))
+        history_json = history_prompt_json(
+            context.get("history", []),
+            settings.PROMPT_HISTORY_LIMIT,
+            settings.PROMPT_HISTORY_TOKEN_BUDGET,
+            settings.LITELLM_TEXT_MODEL,
+        )
 
-        **Tool Definitions:**
-        {json.dumps([t.model_dump() for t in self.tools], indent=2)}
+        plan_key = digest_key(objective, selected_ids_json, history_json)
+        cached_plan = self._plan_cache.get(plan_key)
+        if cached_plan is not None:
+            replay_result = await self._replay_plan(
+                plan_key, cached_plan, context, invoke_agent, send_status_update
+            )
+            if replay_result is not None:
+                return replay_result
 
-        **Contextual Information:**
-        - Selected element IDs: {json.dumps(context.get('selected_ids', []))}
-        - Workflow History (for previous results/element IDs): {json.dumps(context.get('history', []), indent=2)}
-        """
+        context_prompt = self._SYSTEM_PROMPT_CONTEXT.format(
+            selected_ids=selected_ids_json, history=history_json
+        )
 
+        # The preamble goes in its own message ahead of the per-task context. Together
+        # with the tool schemas it forms a byte-identical prefix across turns and tasks,
+        # which the provider's automatic prompt caching can reuse.
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self._preamble_content},
+            {"role": "system", "content": context_prompt},
             {"role": "user", "content": objective},
         ]
 
+        last_signature: Tuple[Tuple[str, str], ...] = ()
+        # Only a task that finished after a single turn of plain workspace tools can be
+        # replayed later: later turns may depend on IDs returned by earlier ones.
+        tool_turns = 0
+        plan_cacheable = True
+        completed = False
         try:
             # Use a loop to allow the agent to make multiple tool calls (e.g., invoke agent then create element)
             for i in range(
@@ -415,75 +942,107 @@ class CanvasAgent(Agent):
                     f"CanvasAgent thinking (step {i+1})...",
                     {"status": "THINKING", "agent_name": self.name},
                 )
-                response = await litellm.acompletion(
-                    model=settings.LITELLM_TEXT_MODEL,
+                response = await acompletion(
                     messages=messages,
-                    tools=[t.model_dump() for t in self.tools],
-                    tool_choice="auto",
-                    temperature=0.0,
-                    api_key=settings.AZURE_API_KEY_TEXT,
-                    api_base=settings.AZURE_API_BASE_TEXT,
-                    api_version=settings.AZURE_API_VERSION_TEXT,
+                    tools=(
+                        _CANVAS_TOOL_SCHEMAS
+                        if i == 0
+                        else _CANVAS_FOLLOW_UP_TOOL_SCHEMAS
+                    ),
+                    **self._llm_kwargs,
                 )
 
-                response_message = response.choices[0].message
-                if not response_message.tool_calls:
+                # Tool calls emitted in the same turn are independent of each other
+                # (element IDs are only known once a call has returned), so they are
+                # dispatched concurrently, each one as soon as it has fully streamed.
+                assistant_message, tool_tasks = await self._consume_stream(
+                    response, context, invoke_agent, send_status_update, last_signature
+                )
+                if not assistant_message["tool_calls"]:
                     logger.info("CanvasAgent finished its thought process.")
+                    completed = True
                     break  # Exit loop if no more tool calls are needed
 
+                # Repeating the exact same calls as the previous turn means the model is
+                # stuck; another round-trip would not produce anything new.
+                signature = _tool_call_signature(assistant_message["tool_calls"])
+                if signature == last_signature:
+                    logger.warning(
+                        "CanvasAgent repeated its previous tool calls. Stopping early."
+                    )
+                    break
+                last_signature = signature
+                # Every call of a turn that differs from the previous one is dispatched,
+                # so each tool_call_id below gets its tool reply.
+                assert len(tool_tasks) == len(assistant_message["tool_calls"])
+
                 messages.append(
-                    response_message
+                    assistant_message
                 )  # Add AI response to conversation history
 
-                for tool_call in response_message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments)
+                # Results are appended in the original order to keep the
+                # tool_call_id sequence the model expects.
+                tool_results = await asyncio.gather(*tool_tasks, return_exceptions=True)
 
-                    await send_status_update(
-                        "AGENT_STATUS_UPDATE",
-                        f"CanvasAgent using tool: {tool_name}...",
-                        {"status": "INVOKING_TOOL", "target_tool": tool_name},
-                    )
-                    logger.info(
-                        f"CanvasAgent is calling tool '{tool_name}' with args: {tool_args}"
-                    )
-
-                    tool_result = {
-                        "status": "failed",
-                        "error": "Tool execution failed or returned unexpected result.",
-                    }  # Default failure
-                    if tool_name == "invoke_agent":
-                        # Special handling for inter-agent communication
-                        agent_to_call = tool_args.get("agent_name")
-                        agent_objective = tool_args.get("objective")
-                        tool_result = await invoke_agent(
-                            agent_to_call, agent_objective, context
+                all_succeeded = True
+                for tool_call, tool_result in zip(
+                    assistant_message["tool_calls"], tool_results
+                ):
+                    tool_name = tool_call["function"]["name"]
+                    if isinstance(tool_result, Exception):
+                        logger.opt(exception=tool_result).error(
+                            f"CanvasAgent tool '{tool_name}' raised an exception."
                         )
-                    else:
-                        # Standard internal tool call
-                        tool_function = self.available_functions.get(tool_name)
-                        if tool_function:
-                            tool_result = await tool_function(
-                                context=context, **tool_args
-                            )
-                        else:
-                            logger.error(
-                                f"Tool '{tool_name}' is defined but not implemented in available_functions."
-                            )
-                            tool_result = {
-                                "status": "failed",
-                                "error": f"Internal error: Tool '{tool_name}' is not implemented.",
-                            }
-
+                        tool_result = {
+                            "status": "failed",
+                            "error": f"Tool execution raised an error: {tool_result}",
+                        }
+                    if (
+                        isinstance(tool_result, dict)
+                        and tool_result.get("status") == "failed"
+                    ):
+                        all_succeeded = False
                     messages.append(
                         {
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call["id"],
                             "name": tool_name,
-                            "content": json.dumps(tool_result),
+                            "content": dumps_tool_result(tool_result),
                         }
                     )
 
+                # Reads are idempotent and were fulfilled locally in the same turn as
+                # the writes, so once the writes have all succeeded they are final and
+                # no further round-trip is made. A failed write goes back to the model.
+                tool_names = {
+                    tool_call["function"]["name"]
+                    for tool_call in assistant_message["tool_calls"]
+                }
+                tool_turns += 1
+                plan_cacheable = (
+                    plan_cacheable
+                    and all_succeeded
+                    and not tool_names & (_AGENT_ROUTED_TOOLS | _READ_ONLY_TOOLS)
+                )
+                if (
+                    all_succeeded
+                    and tool_names & _READ_ONLY_TOOLS
+                    and (tool_names - _READ_ONLY_TOOLS - _AGENT_ROUTED_TOOLS)
+                ):
+                    logger.info(
+                        "CanvasAgent resolved reads and writes in a single turn."
+                    )
+                    break
+
+                # Terminal writes report nothing to reason about; once they have all
+                # succeeded, a follow-up completion would only confirm the result.
+                if all_succeeded and tool_names <= _TERMINAL_TOOLS:
+                    logger.info("CanvasAgent applied terminal updates. Stopping.")
+                    completed = True
+                    break
+
+            if completed and tool_turns == 1 and plan_cacheable:
+                self._plan_cache.put(plan_key, last_signature)
             return {"status": "success"}
 
         except Exception as e:
@@ -493,6 +1052,184 @@ class CanvasAgent(Agent):
                 "error": f"An error occurred during canvas operation: {str(e)}",
             }
 
+    # --- Plan Cache ---
+
+    async def _replay_plan(
+        self,
+        plan_key: str,
+        plan: Tuple[Tuple[str, str], ...],
+        context: Dict[str, Any],
+        invoke_agent: Callable[[str, str, Dict], Coroutine[Any, Any, Any]],
+        send_status_update: Callable,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Re-executes the tool calls of a cached plan without consulting the LLM and
+        returns the task result. A plan that targets elements which no longer exist is
+        evicted before anything is dispatched, and None tells the caller to hand the
+        task to the model. A call that fails once the replay has started is reported
+        as a failure instead: the calls applied before it would be duplicated if the
+        model redid the whole task.
+        """
+        existing = self._workspace.elements
+        missing = {
+            element_id
+            for _, raw_arguments in plan
+            for element_id in _referenced_element_ids(
+                loads_tool_arguments(raw_arguments)
+            )
+            if element_id not in existing
+        }
+        if missing:
+            self._plan_cache.pop(plan_key)
+            logger.info(
+                "CanvasAgent's cached plan targets missing elements {}, asking the model.",
+                sorted(missing),
+            )
+            return None
+
+        logger.info(f"CanvasAgent replaying a cached plan of {len(plan)} tool call(s).")
+        results = await asyncio.gather(
+            *(
+                self._dispatch_tool_call(
+                    tool_name, raw_arguments, context, invoke_agent, send_status_update
+                )
+                for tool_name, raw_arguments in plan
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception) or (
+                isinstance(result, dict) and result.get("status") == "failed"
+            ):
+                self._plan_cache.pop(plan_key)
+                error = result.get("error") if isinstance(result, dict) else result
+                return {
+                    "status": "failed",
+                    "error": f"A cached canvas plan could not be replayed: {error}",
+                }
+        return {"status": "success"}
+
+    async def _consume_stream(
+        self,
+        response: Any,
+        context: Dict[str, Any],
+        invoke_agent: Callable[[str, str, Dict], Coroutine[Any, Any, Any]],
+        send_status_update: Callable,
+        previous_signature: Tuple[Tuple[str, str], ...] = (),
+    ) -> Tuple[Dict[str, Any], List[asyncio.Task]]:
+        """
+        Reads a streamed assistant message, dispatching each tool call as soon as it
+        has fully streamed, while the rest of the message is still arriving.
+        Calls that so far repeat `previous_signature` verbatim are held back until the
+        stream ends, so a turn that repeats the previous one is never executed. Calls
+        held back by a turn that only turns out to differ at the end (e.g. it repeats
+        a prefix of the previous turn) are dispatched then.
+        Returns the assistant message and the dispatch tasks in tool call order.
+        """
+        tool_tasks: List[asyncio.Task] = []
+
+        def dispatch(tool_calls: List[Dict[str, Any]], up_to: int) -> None:
+            for tool_call in tool_calls[len(tool_tasks) : up_to]:
+                function = tool_call["function"]
+                tool_tasks.append(
+                    asyncio.create_task(
+                        self._dispatch_tool_call(
+                            function["name"],
+                            function["arguments"],
+                            context,
+                            invoke_agent,
+                            send_status_update,
+                        )
+                    )
+                )
+
+        def dispatch_completed(tool_calls: List[Dict[str, Any]], up_to: int) -> None:
+            if _tool_call_signature(tool_calls[:up_to]) == previous_signature[:up_to]:
+                return
+            dispatch(tool_calls, up_to)
+
+        try:
+            assistant_message = await consume_tool_call_stream(
+                response, dispatch_completed
+            )
+        except BaseException:
+            for task in tool_tasks:
+                task.cancel()
+            raise
+        tool_calls = assistant_message["tool_calls"]
+        if _tool_call_signature(tool_calls) != previous_signature:
+            dispatch(tool_calls, len(tool_calls))
+        return assistant_message, tool_tasks
+
+    async def _dispatch_tool_call(
+        self,
+        tool_name: str,
+        raw_arguments: Any,
+        context: Dict[str, Any],
+        invoke_agent: Callable[[str, str, Dict], Coroutine[Any, Any, Any]],
+        send_status_update: Callable,
+    ) -> Dict[str, Any]:
+        """Executes a single tool call from the LLM and returns its result."""
+        # Malformed calls are answered with a failed result the model can correct on
+        # its next turn, without raising through the turn's gather.
+        try:
+            tool_args = loads_tool_arguments(raw_arguments)
+        except ValueError as e:
+            error = f"Arguments for '{tool_name}' are not valid JSON: {e}"
+        else:
+            error = _tool_arguments_error(tool_name, tool_args)
+        if error:
+            logger.warning(f"CanvasAgent rejected a tool call: {error}")
+            return {"status": "failed", "error": error}
+
+        # Workspace tools run one at a time in dispatch order. The lock is taken before
+        # the first await, so concurrently dispatched calls cannot overtake each other.
+        # Calls routed to other agents overlap, bounded by a semaphore.
+        if tool_name in _AGENT_ROUTED_TOOLS:
+            guard = self._agent_invocation_slots
+        else:
+            guard = self._workspace_lock
+        async with guard:
+            await send_status_update(
+                "AGENT_STATUS_UPDATE",
+                f"CanvasAgent using tool: {tool_name}...",
+                {"status": "INVOKING_TOOL", "target_tool": tool_name},
+            )
+            logger.info(
+                "CanvasAgent is calling tool '{}' with args: {}", tool_name, tool_args
+            )
+
+            if tool_name in _AGENT_ROUTED_TOOLS:
+                # Special handling for inter-agent communication
+                return await invoke_agent(
+                    tool_args.get("agent_name"), tool_args.get("objective"), context
+                )
+
+            # Standard internal tool call
+            tool_function = self._dispatch.get(tool_name)
+            if tool_function is None:
+                logger.error(
+                    f"Tool '{tool_name}' is defined but not implemented in available_functions."
+                )
+                return {
+                    "status": "failed",
+                    "error": f"Internal error: Tool '{tool_name}' is not implemented.",
+                }
+            return await tool_function(context=context, **tool_args)
+
+    # --- Read-only Tool Implementations ---
+
+    async def _get_canvas_elements(self, context: dict) -> str:
+        # The snapshot is reused for as long as the workspace has not been mutated,
+        # so repeated reads within a reasoning loop skip the dump and JSON encoding.
+        revision = self._workspace.revision
+        if self._canvas_snapshot is None or self._canvas_snapshot[0] != revision:
+            elements_json = ElementListAdapter.dump_json(
+                list(self._workspace.elements.values())
+            ).decode()
+            self._canvas_snapshot = (revision, elements_json)
+        return self._canvas_snapshot[1]
+
     # --- Tool Implementations ---
     # These methods interact with the WorkspaceService to create/update elements.
     # They append commands to the shared context.
@@ -511,6 +1248,9 @@ class CanvasAgent(Agent):
         stroke_width: float = 1,
         corner_radius: float = 0,
     ) -> dict:
+        # The arguments were already constrained by the tool's JSON schema, so
+        # validation can optionally be skipped on this hot path.
+        trusted = settings.TRUST_LLM_TOOL_ARGS
         payload = {
             "element_type": "shape",
             "shape_type": shape_type,
@@ -518,22 +1258,24 @@ class CanvasAgent(Agent):
             "y": y,
             "width": width,
             "height": height,
-            "fill": {"type": "solid", "color": fill_color},
+            "fill": _solid_fill(fill_color, trusted),
             "cornerRadius": corner_radius,
             "parentId": parentId,
         }
         if stroke_color:
-            payload["stroke"] = {"type": "solid", "color": stroke_color}
+            payload["stroke"] = _solid_fill(stroke_color, trusted)
             payload["strokeWidth"] = stroke_width
 
-        element = self._workspace.create_element_from_payload(payload)
+        element = self._workspace.create_element_from_payload(
+            payload, validate=not trusted
+        )
         if not element:
             return {
                 "status": "failed",
                 "error": "Workspace failed to create shape element.",
             }
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
 
@@ -564,14 +1306,16 @@ class CanvasAgent(Agent):
             "textAlign": textAlign,
             "parentId": parentId,
         }
-        element = self._workspace.create_element_from_payload(payload)
+        element = self._workspace.create_element_from_payload(
+            payload, validate=not settings.TRUST_LLM_TOOL_ARGS
+        )
         if not element:
             return {
                 "status": "failed",
                 "error": "Workspace failed to create text element.",
             }
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
 
@@ -596,14 +1340,16 @@ class CanvasAgent(Agent):
             "height": height,
             "parentId": parentId,
         }
-        element = self._workspace.create_element_from_payload(payload)
+        element = self._workspace.create_element_from_payload(
+            payload, validate=not settings.TRUST_LLM_TOOL_ARGS
+        )
         if not element:
             return {
                 "status": "failed",
                 "error": "Workspace failed to create image element.",
             }
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
 
@@ -617,10 +1363,56 @@ class CanvasAgent(Agent):
                 "error": f"Workspace failed to update element {element_id}.",
             }
         context["commands"].append(
-            {"type": "ELEMENT_UPDATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_UPDATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
 
+    async def _update_elements(self, context: dict, updates: List[Dict]) -> dict:
+        elements = self._workspace.update_elements_bulk(
+            [
+                {**item.get("updates", {}), "id": item.get("element_id")}
+                for item in updates
+            ]
+        )
+        if not elements:
+            return {
+                "status": "failed",
+                "error": "Workspace failed to update any of the requested elements.",
+            }
+        context["commands"].append(
+            {
+                "type": "ELEMENTS_UPDATED",
+                "payload": ElementListAdapter.dump_python(elements),
+            }
+        )
+        return {"status": "success", "updated_element_ids": [el.id for el in elements]}
+
+    async def _reorder_elements(
+        self, context: dict, element_ids: List[str], command: str
+    ) -> dict:
+        if not any(self._workspace.elements.get(eid) for eid in element_ids):
+            return {
+                "status": "failed",
+                "error": "No elements were reordered. None of the IDs exist.",
+            }
+        elements = self._workspace.reorder_elements_bulk(element_ids, command)
+        if not elements:
+            # The elements are already in the requested position.
+            return {"status": "success", "reordered_element_ids": []}
+        context["commands"].append(
+            {
+                "type": "ELEMENTS_UPDATED",
+                "payload": ElementListAdapter.dump_python(elements),
+            }
+        )
+        affected_ids = {el.id for el in elements}
+        return {
+            "status": "success",
+            "reordered_element_ids": [
+                eid for eid in element_ids if eid in affected_ids
+            ],
+        }
+
     async def _create_frame(
         self,
         context: dict,
@@ -635,6 +1427,8 @@ class CanvasAgent(Agent):
         corner_radius: float = 0,
         parentId: str = None,
     ) -> dict:
+        # Same fast path as create_shape: the colors arrive as plain strings.
+        trusted = settings.TRUST_LLM_TOOL_ARGS
         payload = {
             "element_type": "frame",
             "name": name,
@@ -642,20 +1436,49 @@ class CanvasAgent(Agent):
             "y": y,
             "width": width,
             "height": height,
-            "fill": {"type": "solid", "color": fill_color},
-            "stroke": {"type": "solid", "color": stroke_color},
+            "fill": _solid_fill(fill_color, trusted),
+            "stroke": _solid_fill(stroke_color, trusted),
             "strokeWidth": stroke_width,
             "cornerRadius": corner_radius,
             "parentId": parentId,
         }
-        element = self._workspace.create_element_from_payload(payload)
+        element = self._workspace.create_element_from_payload(
+            payload, validate=not trusted
+        )
         if not element:
             return {"status": "failed", "error": "Workspace failed to create frame."}
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
 
+    def _create_many(
+        self, context: dict, payloads: List[Dict[str, Any]], description: str
+    ) -> dict:
+        """
+        Creates the elements of a compound pattern in one workspace batch and reports
+        them to the frontend as a single ELEMENTS_UPDATED command (an upsert there),
+        rather than one ELEMENT_CREATED command per element.
+        The payloads are assembled here from typed values (fills are built as models),
+        so they take the same optional validation fast path as the single-element
+        tools.
+        """
+        elements = self._workspace.create_elements_batch(
+            payloads, validate=not settings.TRUST_LLM_TOOL_ARGS
+        )
+        if not elements:
+            return {
+                "status": "failed",
+                "error": f"Workspace failed to create {description} elements.",
+            }
+        context["commands"].append(
+            {
+                "type": "ELEMENTS_UPDATED",
+                "payload": ElementListAdapter.dump_python(elements),
+            }
+        )
+        return {"status": "success", "created_element_ids": [el.id for el in elements]}
+
     async def _create_header_bar(
         self,
         context: dict,
@@ -670,66 +1493,9 @@ class CanvasAgent(Agent):
                 "status": "failed",
                 "error": f"Parent frame {parent_frame_id} not found for header.",
             }
-
-        header_elements_payloads = []
-        # Background rectangle for the header
-        header_elements_payloads.append(
-            {
-                "element_type": "shape",
-                "shape_type": "rect",
-                "parentId": parent_frame_id,
-                "x": 0,
-                "y": 0,
-                "width": frame.width,
-                "height": height,
-                "fill": {"type": "solid", "color": "#222222"},  # Use palette color
-            }
-        )
-        # Logo text
-        header_elements_payloads.append(
-            {
-                "element_type": "text",
-                "parentId": parent_frame_id,
-                "content": logo_text,
-                "x": 20,
-                "y": height / 2 - 12,
-                "width": 150,
-                "height": 24,
-                "fontSize": 20,
-                "fontWeight": 700,
-                "fontColor": "#007AFF",  # Accent color
-            }
+        return self._create_many(
+            context, _header_bar_payloads(frame, height, logo_text, nav_links), "header"
         )
-        # Navigation links
-        current_x = frame.width - 20 - (len(nav_links) * 100)  # Right align
-        for link_text in nav_links:
-            header_elements_payloads.append(
-                {
-                    "element_type": "text",
-                    "parentId": parent_frame_id,
-                    "content": link_text,
-                    "x": current_x,
-                    "y": height / 2 - 8,
-                    "width": 80,
-                    "height": 16,
-                    "fontSize": 14,
-                    "fontColor": "#B0B0B0",
-                    "textAlign": "center",
-                }
-            )
-            current_x += 100  # Spacing between links
-
-        elements = self._workspace.create_elements_batch(header_elements_payloads)
-        if not elements:
-            return {
-                "status": "failed",
-                "error": "Workspace failed to create header elements.",
-            }
-        for el in elements:
-            context["commands"].append(
-                {"type": "ELEMENT_CREATED", "payload": el.model_dump()}
-            )
-        return {"status": "success", "created_element_ids": [el.id for el in elements]}
 
     async def _create_sidebar_layout(
         self,
@@ -745,52 +1511,9 @@ class CanvasAgent(Agent):
                 "status": "failed",
                 "error": f"Parent frame {parent_frame_id} not found for sidebar.",
             }
-
-        sidebar_x = 0 if position == "left" else frame.width - width
-        sidebar_elements_payloads = []
-        # Background for sidebar
-        sidebar_elements_payloads.append(
-            {
-                "element_type": "shape",
-                "shape_type": "rect",
-                "parentId": parent_frame_id,
-                "x": sidebar_x,
-                "y": 0,
-                "width": width,
-                "height": frame.height,
-                "fill": {"type": "solid", "color": "#2A2A2A"},  # Use palette color
-            }
+        return self._create_many(
+            context, _sidebar_payloads(frame, width, position, nav_items), "sidebar"
         )
-        # Navigation items
-        current_y = 60  # Start below a potential header or just from top
-        for item_text in nav_items:
-            sidebar_elements_payloads.append(
-                {
-                    "element_type": "text",
-                    "parentId": parent_frame_id,
-                    "content": item_text,
-                    "x": sidebar_x + 20,
-                    "y": current_y,
-                    "width": width - 40,
-                    "height": 24,
-                    "fontSize": 16,
-                    "fontColor": "#FFFFFF",
-                    "fontWeight": 400,
-                }
-            )
-            current_y += 40  # Spacing between items
-
-        elements = self._workspace.create_elements_batch(sidebar_elements_payloads)
-        if not elements:
-            return {
-                "status": "failed",
-                "error": "Workspace failed to create sidebar elements.",
-            }
-        for el in elements:
-            context["commands"].append(
-                {"type": "ELEMENT_CREATED", "payload": el.model_dump()}
-            )
-        return {"status": "success", "created_element_ids": [el.id for el in elements]}
 
     async def _create_data_card(
         self,
@@ -804,74 +1527,48 @@ class CanvasAgent(Agent):
         value: str,
         subtitle: str = None,
     ) -> dict:
-        card_elements_payloads = []
-        # Card background
-        card_elements_payloads.append(
-            {
-                "element_type": "shape",
-                "shape_type": "rect",
-                "parentId": parent_frame_id,
-                "x": x,
-                "y": y,
-                "width": width,
-                "height": height,
-                "fill": {"type": "solid", "color": "#222222"},  # Use palette color
-                "cornerRadius": 8,
-            }
-        )
-        # Title
-        card_elements_payloads.append(
-            {
-                "element_type": "text",
-                "parentId": parent_frame_id,
-                "content": title,
-                "x": x + 20,
-                "y": y + 20,
-                "width": width - 40,
-                "height": 20,
-                "fontSize": 16,
-                "fontColor": "#B0B0B0",
-            }
+        return self._create_many(
+            context,
+            _data_card_payloads(
+                parent_frame_id, x, y, width, height, title, value, subtitle
+            ),
+            "data card",
         )
-        # Value
-        card_elements_payloads.append(
-            {
-                "element_type": "text",
-                "parentId": parent_frame_id,
-                "content": value,
-                "x": x + 20,
-                "y": y + 45,
-                "width": width - 40,
-                "height": 30,
-                "fontSize": 28,
-                "fontWeight": 700,
-                "fontColor": "#FFFFFF",
+
+    async def _create_dashboard_layout(
+        self,
+        context: dict,
+        parent_frame_id: str,
+        header: Optional[Dict[str, Any]] = None,
+        sidebar: Optional[Dict[str, Any]] = None,
+        cards: Optional[List[Dict[str, Any]]] = None,
+    ) -> dict:
+        """
+        Builds a header bar, a sidebar and any number of data cards in one workspace
+        batch: a single history entry and a single ELEMENTS_UPDATED command, instead
+        of one per pattern.
+        """
+        frame = self._workspace.elements.get(parent_frame_id)
+        if not frame:
+            return {
+                "status": "failed",
+                "error": f"Parent frame {parent_frame_id} not found for dashboard.",
             }
-        )
-        # Subtitle
-        if subtitle:
-            card_elements_payloads.append(
-                {
-                    "element_type": "text",
-                    "parentId": parent_frame_id,
-                    "content": subtitle,
-                    "x": x + 20,
-                    "y": y + 80,
-                    "width": width - 40,
-                    "height": 16,
-                    "fontSize": 14,
-                    "fontColor": "#888888",
-                }
-            )
 
-        elements = self._workspace.create_elements_batch(card_elements_payloads)
-        if not elements:
+        payloads: List[Dict[str, Any]] = []
+        try:
+            if header:
+                payloads += _header_bar_payloads(frame, **header)
+            if sidebar:
+                payloads += _sidebar_payloads(frame, **sidebar)
+            for card in cards or ():
+                payloads += _data_card_payloads(parent_frame_id, **card)
+        except TypeError as e:
+            # A section object with missing or unexpected fields.
+            return {"status": "failed", "error": f"Invalid dashboard section: {e}"}
+        if not payloads:
             return {
                 "status": "failed",
-                "error": "Workspace failed to create data card elements.",
+                "error": "A dashboard needs at least one of header, sidebar or cards.",
             }
-        for el in elements:
-            context["commands"].append(
-                {"type": "ELEMENT_CREATED", "payload": el.model_dump()}
-            )
-        return {"status": "success", "created_element_ids": [el.id for el in elements]}
+        return self._create_many(context, payloads, "dashboard")
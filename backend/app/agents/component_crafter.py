@@ -1,12 +1,105 @@
-import json
-import litellm
+import asyncio
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine
+from pydantic import ValidationError
 
 from ..core.config import settings
 from .models import Agent, Tool
+from .llm import acompletion
+from .serialization import (
+    assistant_message_dict,
+    dumps_prompt_context,
+    dumps_tool_result,
+    loads_tool_arguments,
+)
+from ..models.elements import ElementAdapter
 from ..services.workspace_service import WorkspaceService
 
+# The final step of the component process. A turn in which it succeeds ends the task.
+_TERMINAL_TOOLS = frozenset({"define_component_from_elements"})
+
+# The tool schemas are static, so they are built once at import time and shared
+# by every instance. Their dumped form is reused for every completion request.
+_COMPONENT_TOOLS: List[Tool] = [
+    Tool(
+        function={
+            "name": "get_elements_by_id",
+            "description": "Retrieves the properties of one or more elements to inspect their content and type before creating a component.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "element_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                    }
+                },
+                "required": ["element_ids"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "define_component_from_elements",
+            "description": "The final step to create the component definition and instance from the source elements.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "A descriptive name for the new component (e.g., 'Primary Button', 'User Profile Card').",
+                    },
+                    "source_element_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The original element IDs to be converted into the component.",
+                    },
+                    "schema": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "prop_name": {
+                                    "type": "string",
+                                    "description": "A machine-readable name for the property (e.g., 'button_label', 'user_avatar_src').",
+                                },
+                                "target_element_id": {
+                                    "type": "string",
+                                    "description": "The ID of the element within the component that this property controls.",
+                                },
+                                "target_property": {
+                                    "type": "string",
+                                    "description": "The attribute of the target element to change (e.g., 'content' for text, 'src' for images).",
+                                },
+                                "prop_type": {
+                                    "type": "string",
+                                    "enum": ["text", "image_url", "color"],
+                                    "description": "The data type of the property.",
+                                },
+                            },
+                            "required": [
+                                "prop_name",
+                                "target_element_id",
+                                "target_property",
+                                "prop_type",
+                            ],
+                        },
+                        "description": "A list defining the customizable properties of the component.",
+                    },
+                },
+                "required": ["name", "source_element_ids", "schema"],
+            },
+        }
+    ),
+]
+_COMPONENT_TOOL_SCHEMAS: List[Dict[str, Any]] = [
+    t.model_dump() for t in _COMPONENT_TOOLS
+]
+_DEFINE_TOOL_CHOICE: Dict[str, Any] = {
+    "type": "function",
+    "function": {"name": "define_component_from_elements"},
+}
+
 
 class ComponentCrafter(Agent):
     """
@@ -14,14 +107,39 @@ class ComponentCrafter(Agent):
     of existing elements on the canvas.
     """
 
+    # The system prompt has no per-task parts, so it is a class-level constant.
+    _SYSTEM_PROMPT = """
+        You are an expert UI/UX Component Designer. Your job is to convert a selection of raw elements into a smart, reusable component. You MUST follow this two-step process:
+
+        1.  **INSPECT:** The selected elements (IDs, types, text content and image sources) are listed in the user message. Only call `get_elements_by_id` if you need to look at them again after a failed attempt.
+        2.  **DEFINE:** Analyze the element data to understand its purpose (e.g., a button, a user card). Based on your analysis, generate a `schema` of customizable properties. For example, a text element's 'content' should be a property, and an image's 'src' should be a property. Then, call the `define_component_from_elements` tool with the component name, the original element IDs, and the schema you designed.
+        """
+
     def __init__(self, workspace_service: WorkspaceService):
         self._workspace = workspace_service
+        # Completion parameters that stay the same for every LLM turn of this agent.
+        self._llm_kwargs: Dict[str, Any] = {
+            "model": settings.LITELLM_TEXT_MODEL,
+            "tools": _COMPONENT_TOOL_SCHEMAS,
+            "temperature": 0.0,
+            # The only output is a tool call; the schema arguments are the longest
+            # part and stay well below this.
+            "max_tokens": 1024,
+            "api_key": settings.AZURE_API_KEY_TEXT,
+            "api_base": settings.AZURE_API_BASE_TEXT,
+            "api_version": settings.AZURE_API_VERSION_TEXT,
+        }
+        # Built once per instance so tool dispatch is a single dict lookup.
+        self._dispatch: Dict[str, Callable] = {
+            "get_elements_by_id": self._get_elements_by_id,
+            "define_component_from_elements": self._define_component_from_elements,
+        }
 
     @property
     def name(self) -> str:
         return "ComponentCrafter"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "Creates reusable UI components (e.g., buttons, cards, profiles) from a selection of existing elements. It intelligently defines which parts of the new component are customizable.",
@@ -32,84 +150,11 @@ class ComponentCrafter(Agent):
 
     @property
     def tools(self) -> List[Tool]:
-        return [
-            Tool(
-                function={
-                    "name": "get_elements_by_id",
-                    "description": "Retrieves the properties of one or more elements to inspect their content and type before creating a component.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "element_ids": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                            }
-                        },
-                        "required": ["element_ids"],
-                    },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "define_component_from_elements",
-                    "description": "The final step to create the component definition and instance from the source elements.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "name": {
-                                "type": "string",
-                                "description": "A descriptive name for the new component (e.g., 'Primary Button', 'User Profile Card').",
-                            },
-                            "source_element_ids": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "The original element IDs to be converted into the component.",
-                            },
-                            "schema": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "prop_name": {
-                                            "type": "string",
-                                            "description": "A machine-readable name for the property (e.g., 'button_label', 'user_avatar_src').",
-                                        },
-                                        "target_element_id": {
-                                            "type": "string",
-                                            "description": "The ID of the element within the component that this property controls.",
-                                        },
-                                        "target_property": {
-                                            "type": "string",
-                                            "description": "The attribute of the target element to change (e.g., 'content' for text, 'src' for images).",
-                                        },
-                                        "prop_type": {
-                                            "type": "string",
-                                            "enum": ["text", "image_url", "color"],
-                                            "description": "The data type of the property.",
-                                        },
-                                    },
-                                    "required": [
-                                        "prop_name",
-                                        "target_element_id",
-                                        "target_property",
-                                        "prop_type",
-                                    ],
-                                },
-                                "description": "A list defining the customizable properties of the component.",
-                            },
-                        },
-                        "required": ["name", "source_element_ids", "schema"],
-                    },
-                }
-            ),
-        ]
+        return _COMPONENT_TOOLS
 
     @property
     def available_functions(self) -> Dict[str, Callable]:
-        return {
-            "get_elements_by_id": self._get_elements_by_id,
-            "define_component_from_elements": self._define_component_from_elements,
-        }
+        return self._dispatch
 
     async def run_task(
         self,
@@ -126,85 +171,163 @@ class ComponentCrafter(Agent):
                 "error": "ComponentCrafter requires at least one element to be selected.",
             }
 
-        system_prompt = f"""
-        You are an expert UI/UX Component Designer. Your job is to convert a selection of raw elements into a smart, reusable component. You MUST follow this two-step process:
-
-        1.  **INSPECT:** First, you MUST call the `get_elements_by_id` tool to see what the user has selected. This is a mandatory first step.
-        2.  **DEFINE:** After you receive the element data, analyze it to understand its purpose (e.g., a button, a user card). Based on your analysis, generate a `schema` of customizable properties. For example, a text element's 'content' should be a property, and an image's 'src' should be a property. Then, call the `define_component_from_elements` tool with the component name, the original element IDs, and the schema you designed.
-        """
+        # The selection is summarized up front and sent with the objective, so the
+        # first completion can define the component directly instead of spending a
+        # round trip on the mandatory inspection call.
+        selection = await self._get_elements_by_id(context, element_ids)
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self._SYSTEM_PROMPT},
             {
                 "role": "user",
-                "content": f"Objective: '{objective}'. Selected element IDs are: {json.dumps(element_ids)}",
+                "content": f"Objective: '{objective}'. The selected elements are: {dumps_prompt_context(selection['elements'])}",
             },
         ]
 
+        # Element summaries already returned in this task, by requested ID set. The
+        # selection does not change until the component is defined, which ends the
+        # task, so a repeated inspection is answered without another workspace walk.
+        lookup_cache: Dict[frozenset, Dict[str, Any]] = {
+            frozenset(element_ids): selection
+        }
+
         try:
             # Use the standard tool-calling loop. It will handle the multi-step reasoning.
-            for _ in range(3):  # Limit to 3 steps: inspect -> define -> finish
+            for i in range(3):  # Limit to 3 steps: define, then retries on failure
                 await send_status_update(
                     "AGENT_STATUS_UPDATE",
                     "Analyzing selected elements...",
                     {"status": "THINKING", "agent_name": self.name},
                 )
-                response = await litellm.acompletion(
-                    model=settings.LITELLM_TEXT_MODEL,
+                response = await acompletion(
                     messages=messages,
-                    tools=[t.model_dump() for t in self.tools],
-                    temperature=0.1,
-                    api_key=settings.AZURE_API_KEY_TEXT,
-                    api_base=settings.AZURE_API_BASE_TEXT,
-                    api_version=settings.AZURE_API_VERSION_TEXT,
+                    # The first turn has everything it needs, so it must define the
+                    # component; later turns may inspect again to fix a failure.
+                    tool_choice=_DEFINE_TOOL_CHOICE if i == 0 else "auto",
+                    **self._llm_kwargs,
                 )
                 response_message = response.choices[0].message
                 if not response_message.tool_calls:
                     break
 
-                messages.append(response_message)
-                for tool_call in response_message.tool_calls:
+                messages.append(assistant_message_dict(response_message))
+                # Independent tool calls of one turn run concurrently; gather keeps
+                # the results in the order of the calls.
+                tool_results = await asyncio.gather(
+                    *(
+                        self._run_tool_call(
+                            tool_call, context, send_status_update, lookup_cache
+                        )
+                        for tool_call in response_message.tool_calls
+                    ),
+                    return_exceptions=True,
+                )
+                component_defined = False
+                for tool_call, tool_result in zip(
+                    response_message.tool_calls, tool_results
+                ):
                     tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments)
-                    await send_status_update(
-                        "AGENT_STATUS_UPDATE",
-                        f"Using tool: {tool_name}...",
-                        {"status": "INVOKING_TOOL", "target_tool": tool_name},
-                    )
-                    tool_function = self.available_functions.get(tool_name)
-                    tool_result = await tool_function(context=context, **tool_args)
+                    if isinstance(tool_result, Exception):
+                        logger.opt(exception=tool_result).error(
+                            f"ComponentCrafter tool '{tool_name}' raised an exception."
+                        )
+                        tool_result = {
+                            "status": "failed",
+                            "error": f"Tool execution raised an error: {tool_result}",
+                        }
                     messages.append(
                         {
                             "role": "tool",
                             "tool_call_id": tool_call.id,
                             "name": tool_name,
-                            "content": json.dumps(tool_result),
+                            "content": dumps_tool_result(tool_result),
                         }
                     )
+                    if (
+                        tool_name in _TERMINAL_TOOLS
+                        and tool_result.get("status") == "success"
+                    ):
+                        component_defined = True
+
+                # Defining the component is the last step of the process; a further
+                # completion would only acknowledge it.
+                if component_defined:
+                    logger.info("ComponentCrafter defined the component. Stopping.")
+                    break
 
             return {"status": "success"}
         except Exception as e:
             logger.exception(f"Agent '{self.name}' failed during task execution.")
             return {"status": "failed", "error": str(e)}
 
+    async def _run_tool_call(
+        self,
+        tool_call: Any,
+        context: Dict[str, Any],
+        send_status_update: Callable,
+        lookup_cache: Dict[frozenset, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Executes one tool call and returns its result. Malformed calls are answered
+        with a failed result the model can correct on its next turn, instead of
+        aborting the whole task.
+        """
+        tool_name = tool_call.function.name
+        try:
+            tool_args = loads_tool_arguments(tool_call.function.arguments)
+        except ValueError as e:
+            error = f"Arguments for '{tool_name}' are not valid JSON: {e}"
+            logger.warning(f"ComponentCrafter rejected a tool call: {error}")
+            return {"status": "failed", "error": error}
+        if tool_name == "get_elements_by_id":
+            cache_key = frozenset(tool_args.get("element_ids") or ())
+            cached = lookup_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        tool_function = self._dispatch.get(tool_name)
+        if tool_function is None:
+            # Every tool call still needs a tool message, so an unknown
+            # name is answered with an error rather than skipped.
+            logger.error(
+                "ComponentCrafter received unimplemented tool call: {}", tool_name
+            )
+            return {"status": "failed", "error": f"Unknown tool '{tool_name}'."}
+        await send_status_update(
+            "AGENT_STATUS_UPDATE",
+            f"Using tool: {tool_name}...",
+            {"status": "INVOKING_TOOL", "target_tool": tool_name},
+        )
+        try:
+            tool_result = await tool_function(context=context, **tool_args)
+        except (TypeError, ValidationError) as e:
+            # Unknown or missing argument names, or values the models reject.
+            logger.warning(f"ComponentCrafter tool '{tool_name}' failed: {e}")
+            return {"status": "failed", "error": f"Invalid call to '{tool_name}': {e}"}
+        if tool_name == "get_elements_by_id":
+            lookup_cache[cache_key] = tool_result
+        return tool_result
+
     # --- Tool Implementations ---
     async def _get_elements_by_id(
         self, context: dict, element_ids: List[str]
     ) -> Dict[str, Any]:
-        elements = [
-            self._workspace.elements.get(eid)
-            for eid in element_ids
-            if self._workspace.elements.get(eid)
-        ]
-        # Return a simplified summary for the LLM
-        summary = [
-            {
-                "id": el.id,
-                "element_type": el.element_type,
-                "content": getattr(el, "content", None),
-                "src": getattr(el, "src", None),
-            }
-            for el in elements
-        ]
+        # Return a simplified summary for the LLM, built in a single pass over the
+        # requested IDs. The result stays in the message history for the remaining
+        # turns, so fields an element does not have are left out instead of being
+        # sent as nulls.
+        elements = self._workspace.elements
+        summary = []
+        for eid in element_ids:
+            el = elements.get(eid)
+            if el is None:
+                continue
+            entry = {"id": el.id, "element_type": el.element_type}
+            content = getattr(el, "content", None)
+            if content is not None:
+                entry["content"] = content
+            src = getattr(el, "src", None)
+            if src is not None:
+                entry["src"] = src
+            summary.append(entry)
         return {"elements": summary}
 
     async def _define_component_from_elements(
@@ -214,6 +337,22 @@ class ComponentCrafter(Agent):
         source_element_ids: List[str],
         schema: List[Dict],
     ) -> Dict[str, Any]:
+        # Validate the arguments before the workspace runs its transaction, so the
+        # model gets a precise error it can fix in one retry. Repeated IDs would
+        # otherwise duplicate elements in the component template.
+        source_element_ids = list(dict.fromkeys(source_element_ids))
+        source_set = set(source_element_ids)
+        unknown_targets = [
+            prop.get("target_element_id")
+            for prop in schema
+            if prop.get("target_element_id") not in source_set
+        ]
+        if unknown_targets:
+            return {
+                "status": "failed",
+                "error": f"Schema properties target elements that are not in source_element_ids: {unknown_targets}. Every target_element_id must be one of the source elements.",
+            }
+
         new_def, new_inst, deleted_ids = self._workspace.create_component_from_elements(
             name, source_element_ids, schema
         )
@@ -223,17 +362,23 @@ class ComponentCrafter(Agent):
                 "error": "Workspace service failed to create the component.",
             }
 
-        # Append all necessary commands to the main workflow context
-        context["commands"].append(
-            {"type": "COMPONENT_DEFINITION_CREATED", "payload": new_def.model_dump()}
+        # Append all necessary commands to the main workflow context in one extend
+        context["commands"].extend(
+            [
+                {
+                    "type": "COMPONENT_DEFINITION_CREATED",
+                    "payload": new_def.model_dump(),
+                },
+                {
+                    "type": "ELEMENT_CREATED",
+                    "payload": ElementAdapter.dump_python(new_inst),
+                },
+                *(
+                    {"type": "ELEMENT_DELETED", "payload": {"id": an_id}}
+                    for an_id in deleted_ids
+                ),
+            ]
         )
-        context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": new_inst.model_dump()}
-        )
-        for an_id in deleted_ids:
-            context["commands"].append(
-                {"type": "ELEMENT_DELETED", "payload": {"id": an_id}}
-            )
 
         return {
             "status": "success",
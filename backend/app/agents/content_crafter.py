@@ -1,11 +1,13 @@
 import json
-import litellm
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine, Optional
 from pydantic import BaseModel, Field
 
 from ..core.config import settings
+from ..core.cache import TTLCache, digest_key
 from .models import Agent, Tool
+from .llm import acompletion
 
 
 # --- NEW: Define a Pydantic model for the agent's output ---
@@ -33,11 +35,31 @@ class ContentCrafter(Agent):
     and produces structured text (titles, bullets, etc.) in a JSON format.
     """
 
+    # The output schema never changes, so the system prompt (including the schema's
+    # JSON rendering) is formatted once when the class is created.
+    _SYSTEM_PROMPT = f"""
+        You are an expert content writer and strategist. Your task is to generate clear, concise, and engaging content based on the user's objective.
+
+        **CRITICAL INSTRUCTIONS:**
+        1.  Analyze the user's objective to understand the desired content.
+        2.  Generate the content requested.
+        3.  You MUST format your response as a single, valid JSON object that conforms to the provided schema. Do not add any text or explanation outside of the JSON object.
+
+        **JSON Schema for your output:**
+        {json.dumps(CraftedContent.model_json_schema(), indent=2)}
+        """
+
+    def __init__(self):
+        # Objective digest -> recently crafted content.
+        self._content_cache: TTLCache[CraftedContent] = TTLCache(
+            settings.CONTENT_CACHE_SIZE, settings.CONTENT_CACHE_TTL_SECONDS
+        )
+
     @property
     def name(self) -> str:
         return "ContentCrafter"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "To generate structured written content (titles, subtitles, bullet points, body text) based on a given topic or objective.",
@@ -70,25 +92,23 @@ class ContentCrafter(Agent):
         """
         logger.info(f"Agent '{self.name}' activated with objective: '{objective}'")
 
-        system_prompt = f"""
-        You are an expert content writer and strategist. Your task is to generate clear, concise, and engaging content based on the user's objective.
-
-        **CRITICAL INSTRUCTIONS:**
-        1.  Analyze the user's objective to understand the desired content.
-        2.  Generate the content requested.
-        3.  You MUST format your response as a single, valid JSON object that conforms to the provided schema. Do not add any text or explanation outside of the JSON object.
-
-        **JSON Schema for your output:**
-        {json.dumps(CraftedContent.model_json_schema(), indent=2)}
-        """
+        # The content depends on nothing but the objective, so a repeated request
+        # (e.g. the same outline while iterating on a presentation) is answered
+        # without another LLM round-trip. Within the TTL this also returns the same
+        # text for an objective that was meant to get a fresh variation.
+        content_key = digest_key(objective, settings.LITELLM_TEXT_MODEL)
+        cached_content = self._content_cache.get(content_key)
+        if cached_content is not None:
+            logger.info(f"Agent '{self.name}' reused cached content.")
+            return cached_content.model_dump(exclude_none=True)
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self._SYSTEM_PROMPT},
             {"role": "user", "content": objective},
         ]
 
         try:
-            response = await litellm.acompletion(
+            response = await acompletion(
                 model=settings.LITELLM_TEXT_MODEL,
                 messages=messages,
                 response_format={
@@ -106,6 +126,7 @@ class ContentCrafter(Agent):
             # Parse and validate the response using our Pydantic model
             content_data = CraftedContent.model_validate_json(response_content)
 
+            self._content_cache.put(content_key, content_data)
             # Return the content as a dictionary, which becomes the tool_result for the calling agent
             return content_data.model_dump(exclude_none=True)
 
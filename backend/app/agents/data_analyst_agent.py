@@ -1,15 +1,58 @@
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Optional, Coroutine
-import uuid, tempfile, os, re, asyncio, json, base64, litellm
+import uuid, tempfile, os, re, asyncio, base64
 from fastapi import WebSocket
 
 from ..core.config import settings
 from .models import Agent, Tool
+from .llm import acompletion
+from .serialization import assistant_message_dict, loads_tool_arguments
 from ..services.workspace_service import WorkspaceService
 from ..services.storage_service import StorageService
 from ..services.session_manager import session_manager
 from .prompt_library import get_data_analyst_system_prompt
 
+# Built once at import time and shared by every instance.
+_DATA_ANALYST_TOOLS: List[Tool] = [
+    Tool(function={
+        "name": "send_chat_message",
+        "description": "Send a text message to the user.",
+        "parameters": {
+            "type": "object",
+            "properties": {"message": {"type": "string", "description": "The message to send."}},
+            "required": ["message"]
+        }
+    }),
+    Tool(function={
+        "name": "generate_and_execute_code",
+        "description": "Generate and execute a Python code snippet in the sandboxed environment.",
+        "parameters": {
+            "type": "object",
+            "properties": {"code": {"type": "string", "description": "The Python code to execute."}},
+            "required": ["code"]
+        }
+    }),
+    Tool(function={
+        "name": "place_chart_on_canvas",
+        "description": "Call this as the final step. It takes the generated 'output.png', uploads it, and places it as an image on the main canvas.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "x": {"type": "number", "description": "The desired x-coordinate for the top-left corner of the chart on the canvas."},
+                "y": {"type": "number", "description": "The desired y-coordinate for the top-left corner of the chart on the canvas."},
+                "width": {"type": "number", "description": "The desired width of the chart image on the canvas."},
+                "height": {"type": "number", "description": "The desired height of the chart image on the canvas."}
+            },
+            "required": ["x", "y", "width", "height"]
+        }
+    })
+]
+# Plain-dict form sent with every completion request, dumped once.
+_DATA_ANALYST_TOOL_SCHEMAS: List[Dict[str, Any]] = [t.model_dump() for t in _DATA_ANALYST_TOOLS]
+# Matches the `(asset: <asset_id>)` reference in an objective.
+_ASSET_ID_RE = re.compile(r'\(asset:\s*([a-zA-Z0-9_-]+)\)')
+
 class DataAnalystAgent(Agent):
     def __init__(self, workspace_service: WorkspaceService, storage_service: StorageService):
         self._workspace = workspace_service
@@ -17,7 +60,7 @@ class DataAnalystAgent(Agent):
 
     @property
     def name(self) -> str: return "DataAnalystAgent"
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "To perform interactive data analysis on user-provided spreadsheets (CSV, Excel). It can create charts, tables, and summaries based on a conversational interaction with the user.",
@@ -28,46 +71,13 @@ class DataAnalystAgent(Agent):
 
     @property
     def tools(self) -> List[Tool]:
-        return [
-            Tool(function={
-                "name": "send_chat_message",
-                "description": "Send a text message to the user.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"message": {"type": "string", "description": "The message to send."}},
-                    "required": ["message"]
-                }
-            }),
-            Tool(function={
-                "name": "generate_and_execute_code",
-                "description": "Generate and execute a Python code snippet in the sandboxed environment.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"code": {"type": "string", "description": "The Python code to execute."}},
-                    "required": ["code"]
-                }
-            }),
-            Tool(function={
-                "name": "place_chart_on_canvas",
-                "description": "Call this as the final step. It takes the generated 'output.png', uploads it, and places it as an image on the main canvas.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "x": {"type": "number", "description": "The desired x-coordinate for the top-left corner of the chart on the canvas."},
-                        "y": {"type": "number", "description": "The desired y-coordinate for the top-left corner of the chart on the canvas."},
-                        "width": {"type": "number", "description": "The desired width of the chart image on the canvas."},
-                        "height": {"type": "number", "description": "The desired height of the chart image on the canvas."}
-                    },
-                    "required": ["x", "y", "width", "height"]
-                }
-            })
-        ]
+        return _DATA_ANALYST_TOOLS
 
     @property
     def available_functions(self) -> Dict[str, Callable]: return {}
 
     def _parse_asset_id(self, objective: str) -> Optional[str]:
-        match = re.search(r'\(asset:\s*([a-zA-Z0-9_-]+)\)', objective)
+        match = _ASSET_ID_RE.search(objective)
         return match.group(1) if match else None
 
     async def run_task(
@@ -128,12 +138,12 @@ class DataAnalystAgent(Agent):
             explained_data = False
             while not user_done:
                 logger.info(f"Session {session.session_id}: Awaiting next action from LLM...")
-                response = await litellm.acompletion(
-                    model=settings.LITELLM_TEXT_MODEL, messages=conversation_history, tools=[t.model_dump() for t in self.tools],
+                response = await acompletion(
+                    model=settings.LITELLM_TEXT_MODEL, messages=conversation_history, tools=_DATA_ANALYST_TOOL_SCHEMAS,
                     api_key=settings.AZURE_API_KEY_TEXT, api_base=settings.AZURE_API_BASE_TEXT, api_version=settings.AZURE_API_VERSION_TEXT
                 )
                 response_message = response.choices[0].message
-                conversation_history.append(response_message)
+                conversation_history.append(assistant_message_dict(response_message))
 
                 # If the model wants to just chat without calling a tool
                 if not response_message.tool_calls:
@@ -155,19 +165,21 @@ class DataAnalystAgent(Agent):
                 user_ended = False
                 handled_tool_call_ids = set()
                 for i, tool_call in enumerate(response_message.tool_calls):
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
+                    function = tool_call.function
+                    tool_call_id = tool_call.id
+                    function_name = function.name
+                    function_args = loads_tool_arguments(function.arguments)
                     tool_response = None
                     tool_cancelled = False
 
                     if user_ended:
                         tool_call_results.append({
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call_id,
                             "name": function_name,
                             "content": "User ended the session before tool execution."
                         })
-                        handled_tool_call_ids.add(tool_call.id)
+                        handled_tool_call_ids.add(tool_call_id)
                         continue
 
                     if function_name == "send_chat_message":
@@ -185,11 +197,11 @@ class DataAnalystAgent(Agent):
                             # Only append user message after all tool messages are appended
                         tool_call_results.append({
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call_id,
                             "name": function_name,
                             "content": tool_response
                         })
-                        handled_tool_call_ids.add(tool_call.id)
+                        handled_tool_call_ids.add(tool_call_id)
                         if tool_cancelled:
                             break
 
@@ -208,11 +220,11 @@ class DataAnalystAgent(Agent):
                             )
                         tool_call_results.append({
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call_id,
                             "name": function_name,
                             "content": tool_response
                         })
-                        handled_tool_call_ids.add(tool_call.id)
+                        handled_tool_call_ids.add(tool_call_id)
                         if not explained_data:
                             explained_data = True
                             explanation = ("I've loaded your data and here is a preview. "
@@ -273,11 +285,11 @@ class DataAnalystAgent(Agent):
                                 # Only append user message after all tool messages are appended
                             tool_call_results.append({
                                 "role": "tool",
-                                "tool_call_id": tool_call.id,
+                                "tool_call_id": tool_call_id,
                                 "name": function_name,
                                 "content": tool_response
                             })
-                            handled_tool_call_ids.add(tool_call.id)
+                            handled_tool_call_ids.add(tool_call_id)
                             if tool_cancelled:
                                 break
                         finally:
@@ -286,11 +298,11 @@ class DataAnalystAgent(Agent):
                     else:
                         tool_call_results.append({
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call_id,
                             "name": function_name,
                             "content": "Tool not implemented."
                         })
-                        handled_tool_call_ids.add(tool_call.id)
+                        handled_tool_call_ids.add(tool_call_id)
 
                 # After the loop, ensure all tool_call_ids are handled
                 all_tool_call_ids = {tc.id for tc in response_message.tool_calls}
@@ -1,8 +1,8 @@
 # parsec-backend/app/agents/frontend_architect.py
 
 import json
-import litellm
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine, Union
 import pydantic
 import uuid
@@ -10,6 +10,7 @@ import asyncio
 
 from ..core.config import settings
 from .models import Agent
+from .llm import acompletion
 from ..models import elements as element_models
 from ..services.workspace_service import WorkspaceService
 
@@ -45,7 +46,7 @@ class FrontendArchitect(Agent):
     def name(self) -> str:
         return "FrontendArchitect"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "Designs and builds a complete, professional UI layout using a robust two-step process to ensure detail and quality.",
@@ -138,9 +139,11 @@ class FrontendArchitect(Agent):
                 )
 
             await send_status_update("AGENT_STATUS_UPDATE", "Assembling final build plan...", {"status": "PLANNING"})
-            final_elements_list = (
-                [main_canvas_frame] + container_shapes + all_child_elements
-            )
+            final_elements_list = [
+                main_canvas_frame,
+                *container_shapes,
+                *all_child_elements,
+            ]
             logger.info(f"BUILD PLAN: {final_elements_list}")
             build_plan = self._translate_elements_to_build_plan(final_elements_list)
 
@@ -204,7 +207,7 @@ class FrontendArchitect(Agent):
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": objective},
         ]
-        response = await litellm.acompletion(
+        response = await acompletion(
             model=settings.LITELLM_TEXT_MODEL,
             messages=messages,
             response_format={"type": "json_object"},
@@ -300,7 +303,7 @@ class FrontendArchitect(Agent):
                 "content": f"Create the child elements for the '{container['name']}' container.",
             },
         ]
-        response = await litellm.acompletion(
+        response = await acompletion(
             model=settings.LITELLM_TEXT_MODEL,
             messages=messages,
             response_format={"type": "json_object"},
@@ -326,7 +329,7 @@ class FrontendArchitect(Agent):
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": objective},
         ]
-        response = await litellm.acompletion(
+        response = await acompletion(
             model=settings.LITELLM_TEXT_MODEL,
             messages=messages,
             response_format={"type": "json_object"},
@@ -362,7 +365,10 @@ class FrontendArchitect(Agent):
         element = self._workspace.create_element_from_payload(payload)
         if element:
             context["commands"].append(
-                {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+                {
+                    "type": "ELEMENT_CREATED",
+                    "payload": element_models.ElementAdapter.dump_python(element),
+                }
             )
 
     async def _create_shape(self, context: dict, **params) -> None:
@@ -370,7 +376,10 @@ class FrontendArchitect(Agent):
         element = self._workspace.create_element_from_payload(payload)
         if element:
             context["commands"].append(
-                {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+                {
+                    "type": "ELEMENT_CREATED",
+                    "payload": element_models.ElementAdapter.dump_python(element),
+                }
             )
 
     async def _create_text(self, context: dict, **params) -> None:
@@ -378,5 +387,8 @@ class FrontendArchitect(Agent):
         element = self._workspace.create_element_from_payload(payload)
         if element:
             context["commands"].append(
-                {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+                {
+                    "type": "ELEMENT_CREATED",
+                    "payload": element_models.ElementAdapter.dump_python(element),
+                }
             )
@@ -1,5 +1,6 @@
 import litellm
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine
 
 from ..core.config import settings
@@ -16,7 +17,7 @@ class ImageGenius(Agent):
     def name(self) -> str:
         return "ImageGenius"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "Generates a high-quality image based on a descriptive text prompt.",
@@ -1,12 +1,81 @@
-import json
-import litellm
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine, Literal
 
 from ..core.config import settings
 from .models import Agent, Tool
+from .llm import acompletion
+from .serialization import loads_tool_arguments
+from ..models.elements import ElementListAdapter
 from ..services.workspace_service import WorkspaceService
 
+# The tool schemas are static, so they are built once at import time and shared
+# by every instance. Their dumped form is reused for every completion request.
+_LAYOUT_TOOLS: List[Tool] = [
+    Tool(
+        function={
+            "name": "align_elements",
+            "description": "Calculates new positions to align elements. Use for 'align left', 'center horizontally', 'align top', etc.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "alignment": {
+                        "type": "string",
+                        "enum": [
+                            "left",
+                            "h_center",
+                            "right",
+                            "top",
+                            "v_center",
+                            "bottom",
+                        ],
+                    }
+                },
+                "required": ["alignment"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "distribute_elements_evenly",
+            "description": "Distributes elements evenly between the outermost items. Use for 'space out evenly', 'distribute vertically'.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "direction": {
+                        "type": "string",
+                        "enum": ["horizontal", "vertical"],
+                    }
+                },
+                "required": ["direction"],
+            },
+        }
+    ),
+    # --- THE NEW, MORE POWERFUL TOOL ---
+    Tool(
+        function={
+            "name": "set_spacing_between_elements",
+            "description": "Sets a specific pixel spacing between elements. Use for 'space by 50px', 'add 20px gap'.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "spacing": {
+                        "type": "number",
+                        "description": "The gap in pixels between each element.",
+                    },
+                    "direction": {
+                        "type": "string",
+                        "enum": ["horizontal", "vertical"],
+                        "description": "The direction to apply the spacing.",
+                    },
+                },
+                "required": ["spacing", "direction"],
+            },
+        }
+    ),
+]
+_LAYOUT_TOOL_SCHEMAS: List[Dict[str, Any]] = [t.model_dump() for t in _LAYOUT_TOOLS]
+
 
 class LayoutMaestro(Agent):
     """
@@ -16,12 +85,19 @@ class LayoutMaestro(Agent):
 
     def __init__(self, workspace_service: WorkspaceService):
         self._workspace = workspace_service
+        # Map tool names to the methods that contain the layout math. Built once per
+        # instance so tool dispatch is a single dict lookup.
+        self._dispatch: Dict[str, Callable] = {
+            "align_elements": self._calculate_and_apply_alignment,
+            "distribute_elements_evenly": self._calculate_and_apply_distribution,
+            "set_spacing_between_elements": self._calculate_and_apply_spacing,
+        }
 
     @property
     def name(self) -> str:
         return "LayoutMaestro"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "Arranges, aligns, and distributes existing elements based on a high-level layout objective (e.g., 'Align these left', 'Space these out evenly').",
@@ -32,78 +108,11 @@ class LayoutMaestro(Agent):
 
     @property
     def tools(self) -> List[Tool]:
-        return [
-            Tool(
-                function={
-                    "name": "align_elements",
-                    "description": "Calculates new positions to align elements. Use for 'align left', 'center horizontally', 'align top', etc.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "alignment": {
-                                "type": "string",
-                                "enum": [
-                                    "left",
-                                    "h_center",
-                                    "right",
-                                    "top",
-                                    "v_center",
-                                    "bottom",
-                                ],
-                            }
-                        },
-                        "required": ["alignment"],
-                    },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "distribute_elements_evenly",
-                    "description": "Distributes elements evenly between the outermost items. Use for 'space out evenly', 'distribute vertically'.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "direction": {
-                                "type": "string",
-                                "enum": ["horizontal", "vertical"],
-                            }
-                        },
-                        "required": ["direction"],
-                    },
-                }
-            ),
-            # --- THE NEW, MORE POWERFUL TOOL ---
-            Tool(
-                function={
-                    "name": "set_spacing_between_elements",
-                    "description": "Sets a specific pixel spacing between elements. Use for 'space by 50px', 'add 20px gap'.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "spacing": {
-                                "type": "number",
-                                "description": "The gap in pixels between each element.",
-                            },
-                            "direction": {
-                                "type": "string",
-                                "enum": ["horizontal", "vertical"],
-                                "description": "The direction to apply the spacing.",
-                            },
-                        },
-                        "required": ["spacing", "direction"],
-                    },
-                }
-            ),
-        ]
+        return _LAYOUT_TOOLS
 
     @property
     def available_functions(self) -> Dict[str, Callable]:
-        # Map tool names to the methods that contain the layout math.
-        return {
-            "align_elements": self._calculate_and_apply_alignment,
-            "distribute_elements_evenly": self._calculate_and_apply_distribution,  # Renamed
-            "set_spacing_between_elements": self._calculate_and_apply_spacing,  # New mapping
-        }
+        return self._dispatch
 
     async def run_task(
         self,
@@ -142,10 +151,10 @@ class LayoutMaestro(Agent):
         try:
             # The tool-calling loop we already have naturally supports multi-tool responses,
             # so we don't need to change the loop itself, just the prompt.
-            response = await litellm.acompletion(
+            response = await acompletion(
                 model=settings.LITELLM_TEXT_MODEL,
                 messages=messages,
-                tools=[t.model_dump() for t in self.tools],
+                tools=_LAYOUT_TOOL_SCHEMAS,
                 # We can keep tool_choice="auto", but the new prompt encourages multiple calls if needed.
                 temperature=0.0,
                 api_key=settings.AZURE_API_KEY_TEXT,
@@ -163,7 +172,7 @@ class LayoutMaestro(Agent):
             # This loop will now correctly handle one or MORE tool calls from the LLM
             for tool_call in response_message.tool_calls:
                 tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
+                tool_args = loads_tool_arguments(tool_call.function.arguments)
 
                 tool_function = self.available_functions.get(tool_name)
                 if not tool_function:
@@ -226,11 +235,12 @@ class LayoutMaestro(Agent):
             for el in elements:
                 el.y = avg_center_y - el.height / 2
 
+        self._workspace.mark_modified()
         # Append a single command to the context to update all modified elements
         context["commands"].append(
             {
                 "type": "ELEMENTS_UPDATED",
-                "payload": [el.model_dump() for el in elements],
+                "payload": ElementListAdapter.dump_python(elements),
             }
         )
 
@@ -271,10 +281,11 @@ class LayoutMaestro(Agent):
                 elements[i].y = current_y + gap
                 current_y += elements[i].height + gap
 
+        self._workspace.mark_modified()
         context["commands"].append(
             {
                 "type": "ELEMENTS_UPDATED",
-                "payload": [el.model_dump() for el in elements],
+                "payload": ElementListAdapter.dump_python(elements),
             }
         )
 
@@ -303,9 +314,10 @@ class LayoutMaestro(Agent):
                 elements[i].y = current_y + spacing
                 current_y += elements[i].height + spacing
 
+        self._workspace.mark_modified()
         context["commands"].append(
             {
                 "type": "ELEMENTS_UPDATED",
-                "payload": [el.model_dump() for el in elements],
+                "payload": ElementListAdapter.dump_python(elements),
             }
         )
@@ -0,0 +1,25 @@
+# backend/app/agents/llm.py
+import asyncio
+import litellm
+from typing import Any
+
+from ..core.config import settings
+
+# Shared by every agent in the process, so the total number of text completion
+# requests in flight stays below what the deployment's rate limit allows.
+_COMPLETION_SLOTS = asyncio.Semaphore(settings.LLM_MAX_CONCURRENT_COMPLETIONS)
+
+
+async def acompletion(**kwargs: Any) -> Any:
+    """
+    `litellm.acompletion` behind the process-wide concurrency limit. Requests beyond
+    the limit wait for a slot instead of being rejected with a 429 and backing off.
+    Failed requests are retried `LLM_NUM_RETRIES` times unless the caller says
+    otherwise.
+    The slot is held until the response (or, for `stream=True`, the stream) is
+    returned, not while a stream is consumed: agents dispatch tools, including other
+    agents' completions, while reading their stream.
+    """
+    kwargs.setdefault("num_retries", settings.LLM_NUM_RETRIES)
+    async with _COMPLETION_SLOTS:
+        return await litellm.acompletion(**kwargs)
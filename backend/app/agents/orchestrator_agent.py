@@ -1,10 +1,10 @@
 import json
-import litellm
 from loguru import logger
 from typing import List, Dict, Any, Callable
 from pydantic import BaseModel, Field
 from ..core.config import settings
 from .registry import AgentRegistry
+from .llm import acompletion
 
 
 # A do-nothing fallback function to make the send_status_update parameter optional and safe.
@@ -199,7 +199,7 @@ class OrchestratorAgent:
                 f"Sending prompt to LLM:\n{system_prompt}"
             )  # Log the full prompt for debugging
 
-            response = await litellm.acompletion(
+            response = await acompletion(
                 model=settings.LITELLM_TEXT_MODEL,
                 messages=messages,
                 # Request JSON output directly from the model
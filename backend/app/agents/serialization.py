@@ -0,0 +1,102 @@
+# backend/app/agents/serialization.py
+import litellm
+import orjson
+from typing import Any, Dict, List
+
+
+def dumps_tool_result(result: Any) -> str:
+    """
+    Serializes a tool result into the string content of a `role: tool` message.
+    orjson is used because this runs on the event loop for every tool call, and
+    tool results can carry large element payloads. Results that a tool already
+    returns as a JSON string are passed through unchanged.
+    """
+    if isinstance(result, str):
+        return result
+    return orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def dumps_prompt_context(value: Any, indent: bool = False) -> str:
+    """
+    Serializes workflow context (selected IDs, history) for embedding in a prompt.
+    The history grows with every step of a workflow and is re-encoded for each agent
+    task, so it goes through orjson like the tool payloads.
+    """
+    option = orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(value, option=option).decode()
+
+
+def recent_history(history: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Returns the last `limit` workflow steps for embedding in a prompt. The history
+    grows with every step, while agents only ever need the recent results (element
+    IDs, generated content) to build on.
+    """
+    if limit <= 0:
+        return []
+    return history[-limit:]
+
+
+def history_prompt_json(
+    history: List[Dict[str, Any]], limit: int, token_budget: int, model: str
+) -> str:
+    """
+    Serializes the recent workflow history for a system prompt, dropping the oldest
+    steps until it fits within `token_budget` tokens for `model`. A single step can
+    carry a large generated payload, so the step limit alone does not keep the prompt
+    inside the context window; an overflowing request would only fail after the whole
+    prompt has been uploaded. A budget of 0 disables the check.
+    Each step is counted once, and the newest steps are kept while their running
+    total fits; the list's own brackets and separators are not counted.
+    """
+    recent = recent_history(history, limit)
+    if token_budget > 0:
+        total = 0
+        kept = 0
+        for step in reversed(recent):
+            total += litellm.token_counter(
+                model=model, text=dumps_prompt_context(step, indent=True)
+            )
+            if total > token_budget:
+                break
+            kept += 1
+        recent = recent[len(recent) - kept :]
+    return dumps_prompt_context(recent, indent=True)
+
+
+def assistant_message_dict(message: Any) -> Dict[str, Any]:
+    """
+    Converts the assistant message of a completion response into the dict form
+    accepted by `messages`, the same form `consume_tool_call_stream` returns.
+    Appending the response object itself would make litellm convert it (and its tool
+    calls) back to a dict on every later request of the loop.
+    """
+    message_dict: Dict[str, Any] = {"role": "assistant", "content": message.content}
+    if message.tool_calls:
+        message_dict["tool_calls"] = [
+            {
+                "id": tool_call.id,
+                "type": "function",
+                "function": {
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments,
+                },
+            }
+            for tool_call in message.tool_calls
+        ]
+    return message_dict
+
+
+def loads_tool_arguments(arguments: Any) -> Dict[str, Any]:
+    """
+    Parses the JSON arguments string of an LLM tool call.
+    Tools without parameters usually come back as an empty string or "{}", which
+    short-circuits to an empty dict without going through the parser.
+    """
+    if not arguments or arguments == "{}":
+        return {}
+    if isinstance(arguments, dict):
+        return arguments
+    return orjson.loads(arguments)
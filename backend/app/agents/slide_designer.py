@@ -1,13 +1,113 @@
-import json
 import uuid
-import litellm
+import asyncio
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine
 
 from ..core.config import settings
 from .models import Agent, Tool
+from .llm import acompletion
+from .serialization import (
+    dumps_tool_result,
+    loads_tool_arguments,
+    history_prompt_json,
+)
+from .streaming import consume_tool_call_stream
+from ..models.elements import ElementAdapter
 from ..services.workspace_service import WorkspaceService
 
+# The tool schemas are static, so they are built once at import time and shared
+# by every instance. Their dumped form is reused for every completion request.
+_SLIDE_TOOLS: List[Tool] = [
+    Tool(
+        function={
+            "name": "create_slide_frame",
+            "description": "Creates a new, empty slide frame on the canvas at the next available position and adds it to the presentation order. This is the first step for any new slide.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "slide_title_for_layer_panel": {
+                        "type": "string",
+                        "description": "A descriptive name for the slide, e.g., 'Title Slide' or 'Q3 Results'.",
+                    }
+                },
+                "required": ["slide_title_for_layer_panel"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_text_element",
+            "description": "Creates a text element on a specified slide frame. Use this for titles, subtitles, body text, etc.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "frame_id": {
+                        "type": "string",
+                        "description": "The ID of the slide frame to place the text on.",
+                    },
+                    "text": {
+                        "type": "string",
+                        "description": "The content of the text element.",
+                    },
+                    "role": {
+                        "type": "string",
+                        "enum": ["title", "subtitle", "body", "caption"],
+                        "description": "The semantic role of the text, which determines its styling and placement.",
+                    },
+                },
+                "required": ["frame_id", "text", "role"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "create_image_element",
+            "description": "Places an image on a specified slide frame.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "frame_id": {
+                        "type": "string",
+                        "description": "The ID of the slide frame to place the image on.",
+                    },
+                    "image_url": {
+                        "type": "string",
+                        "description": "The URL of the image to display.",
+                    },
+                    "alt_text": {
+                        "type": "string",
+                        "description": "A descriptive alt text for the image.",
+                    },
+                },
+                "required": ["frame_id", "image_url", "alt_text"],
+            },
+        }
+    ),
+    Tool(
+        function={
+            "name": "invoke_agent",
+            "description": "Calls another specialist agent to perform a task and get information. Use this to get content or images.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "agent_name": {
+                        "type": "string",
+                        "enum": ["ContentCrafter", "ImageGenius"],
+                        "description": "The name of the agent to call.",
+                    },
+                    "objective": {
+                        "type": "string",
+                        "description": "The high-level objective to give to the other agent.",
+                    },
+                },
+                "required": ["agent_name", "objective"],
+            },
+        }
+    ),
+]
+_SLIDE_TOOL_SCHEMAS: List[Dict[str, Any]] = [t.model_dump() for t in _SLIDE_TOOLS]
+
 
 class SlideDesigner(Agent):
     """
@@ -18,16 +118,27 @@ class SlideDesigner(Agent):
 
     def __init__(self, workspace_service: WorkspaceService):
         self._workspace = workspace_service
+        self._workspace_lock = asyncio.Lock()
+        self._agent_invocation_slots = asyncio.Semaphore(
+            settings.MAX_CONCURRENT_AGENT_INVOCATIONS
+        )
         # Find the next available slide position
         self._next_slide_x = 100
         self._next_slide_y = 100
         self._slide_count = 0
+        # Built once per instance so tool dispatch is a single dict lookup.
+        self._dispatch: Dict[str, Callable] = {
+            "create_slide_frame": self._create_slide_frame,
+            "create_text_element": self._create_text_element,
+            "create_image_element": self._create_image_element,
+            "invoke_agent": None,  # This is handled specially in run_task
+        }
 
     @property
     def name(self) -> str:
         return "SlideDesigner"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "To design and create entire presentation slides from a high-level objective. It handles layout, typography, and can autonomously source content and images by calling other agents.",
@@ -39,103 +150,11 @@ class SlideDesigner(Agent):
     # --- NEW, MORE FUNDAMENTAL TOOLS ---
     @property
     def tools(self) -> List[Tool]:
-        return [
-            Tool(
-                function={
-                    "name": "create_slide_frame",
-                    "description": "Creates a new, empty slide frame on the canvas at the next available position and adds it to the presentation order. This is the first step for any new slide.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "slide_title_for_layer_panel": {
-                                "type": "string",
-                                "description": "A descriptive name for the slide, e.g., 'Title Slide' or 'Q3 Results'.",
-                            }
-                        },
-                        "required": ["slide_title_for_layer_panel"],
-                    },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_text_element",
-                    "description": "Creates a text element on a specified slide frame. Use this for titles, subtitles, body text, etc.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "frame_id": {
-                                "type": "string",
-                                "description": "The ID of the slide frame to place the text on.",
-                            },
-                            "text": {
-                                "type": "string",
-                                "description": "The content of the text element.",
-                            },
-                            "role": {
-                                "type": "string",
-                                "enum": ["title", "subtitle", "body", "caption"],
-                                "description": "The semantic role of the text, which determines its styling and placement.",
-                            },
-                        },
-                        "required": ["frame_id", "text", "role"],
-                    },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "create_image_element",
-                    "description": "Places an image on a specified slide frame.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "frame_id": {
-                                "type": "string",
-                                "description": "The ID of the slide frame to place the image on.",
-                            },
-                            "image_url": {
-                                "type": "string",
-                                "description": "The URL of the image to display.",
-                            },
-                            "alt_text": {
-                                "type": "string",
-                                "description": "A descriptive alt text for the image.",
-                            },
-                        },
-                        "required": ["frame_id", "image_url", "alt_text"],
-                    },
-                }
-            ),
-            Tool(
-                function={
-                    "name": "invoke_agent",
-                    "description": "Calls another specialist agent to perform a task and get information. Use this to get content or images.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "agent_name": {
-                                "type": "string",
-                                "enum": ["ContentCrafter", "ImageGenius"],
-                                "description": "The name of the agent to call.",
-                            },
-                            "objective": {
-                                "type": "string",
-                                "description": "The high-level objective to give to the other agent.",
-                            },
-                        },
-                        "required": ["agent_name", "objective"],
-                    },
-                }
-            ),
-        ]
+        return _SLIDE_TOOLS
 
     @property
     def available_functions(self) -> Dict[str, Callable]:
-        return {
-            "create_slide_frame": self._create_slide_frame,
-            "create_text_element": self._create_text_element,
-            "create_image_element": self._create_image_element,
-            "invoke_agent": None,  # This is handled specially in run_task
-        }
+        return self._dispatch
 
     async def run_task(
         self,
@@ -144,8 +163,14 @@ class SlideDesigner(Agent):
         invoke_agent: Callable[[str, str, Dict], Coroutine[Any, Any, Any]],
         send_status_update: Callable,
     ) -> Dict[str, Any]:
-        logger.info(f"Agent '{self.name}' activated with objective: '{objective}'")
+        logger.info("Agent '{}' activated with objective: '{}'", self.name, objective)
 
+        history_json = history_prompt_json(
+            context.get("history", []),
+            settings.PROMPT_HISTORY_LIMIT,
+            settings.PROMPT_HISTORY_TOKEN_BUDGET,
+            settings.LITELLM_TEXT_MODEL,
+        )
         # This is the agent's "brain". It uses an LLM to think for itself.
         system_prompt = f"""
         You are a world-class presentation designer. Your task is to take a high-level objective and break it down into a sequence of tool calls to create a beautiful and effective slide.
@@ -161,7 +186,7 @@ class SlideDesigner(Agent):
         5.  **Respond with Tool Calls:** Make one or more tool calls in a single response to execute your plan.
 
         **Workflow History (for context):**
-        {json.dumps(context.get('history', []), indent=2)}
+        {history_json}
         """
 
         messages = [
@@ -172,62 +197,71 @@ class SlideDesigner(Agent):
         try:
             # We use a loop to allow the agent to make multiple tool calls (e.g., get content, then create slide)
             for _ in range(5):  # Max 5 steps to prevent infinite loops
-                response = await litellm.acompletion(
+                response = await acompletion(
                     model=settings.LITELLM_TEXT_MODEL,
                     messages=messages,
-                    tools=[t.model_dump() for t in self.tools],
+                    tools=_SLIDE_TOOL_SCHEMAS,
                     temperature=0.1,
                     api_key=settings.AZURE_API_KEY_TEXT,
                     api_base=settings.AZURE_API_BASE_TEXT,
                     api_version=settings.AZURE_API_VERSION_TEXT,
+                    stream=True,
                 )
-                response_message = response.choices[0].message
 
-                if not response_message.tool_calls:
+                # Tool calls from the same response are dispatched concurrently, each
+                # as soon as it has fully streamed, so agent invocations (e.g.
+                # ContentCrafter and ImageGenius) overlap with the rest of the message.
+                tool_tasks: List[asyncio.Task] = []
+
+                def dispatch_completed(
+                    tool_calls: List[Dict[str, Any]], up_to: int
+                ) -> None:
+                    for tool_call in tool_calls[len(tool_tasks) : up_to]:
+                        tool_tasks.append(
+                            asyncio.create_task(
+                                self._dispatch_tool_call(
+                                    tool_call["function"]["name"],
+                                    tool_call["function"]["arguments"],
+                                    context,
+                                    invoke_agent,
+                                    send_status_update,
+                                )
+                            )
+                        )
+
+                try:
+                    response_message = await consume_tool_call_stream(
+                        response, dispatch_completed
+                    )
+                except BaseException:
+                    for task in tool_tasks:
+                        task.cancel()
+                    raise
+
+                if not response_message["tool_calls"]:
                     logger.info("SlideDesigner finished its thought process.")
                     break  # Exit loop if no more tool calls are needed
 
                 messages.append(response_message)  # Add AI response to history
 
-                # Execute tool calls
-                for tool_call in response_message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments)
-
-                    logger.info(
-                        f"SlideDesigner is calling tool '{tool_name}' with args: {tool_args}"
-                    )
+                tool_results = await asyncio.gather(*tool_tasks, return_exceptions=True)
 
-                    if tool_name == "invoke_agent":
-                        # Special handling for inter-agent communication
-                        agent_to_call = tool_args.get("agent_name")
-                        agent_objective = tool_args.get("objective")
-                        await send_status_update(
-                            "AGENT_STATUS_UPDATE",
-                            f"Asking the {agent_to_call} for help...",
-                            {"status": "INVOKING_AGENT", "target_agent": agent_to_call},
+                # Append tool results to conversation for the next reasoning step
+                for tool_call, tool_result in zip(
+                    response_message["tool_calls"], tool_results
+                ):
+                    tool_name = tool_call["function"]["name"]
+                    if isinstance(tool_result, Exception):
+                        logger.opt(exception=tool_result).error(
+                            f"SlideDesigner tool '{tool_name}' raised an exception."
                         )
-                        tool_result = await invoke_agent(
-                            agent_to_call, agent_objective, context
-                        )
-                    else:
-                        # Standard internal tool call
-                        tool_function = self.available_functions.get(tool_name)
-                        # We pass the context so tools can append commands directly
-                        await send_status_update(
-                            "AGENT_STATUS_UPDATE",
-                            f"Using the tool {tool_name}...",
-                            {"status": "INVOKING_TOOL", "target_tool": tool_name},
-                        )
-                        tool_result = await tool_function(context=context, **tool_args)
-
-                    # Append tool result to conversation for the next reasoning step
+                        tool_result = {"status": "failed", "error": str(tool_result)}
                     messages.append(
                         {
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
+                            "tool_call_id": tool_call["id"],
                             "name": tool_name,
-                            "content": json.dumps(tool_result),
+                            "content": dumps_tool_result(tool_result),
                         }
                     )
 
@@ -237,6 +271,50 @@ class SlideDesigner(Agent):
             logger.exception(f"Agent '{self.name}' failed during task execution.")
             return {"status": "failed", "error": str(e)}
 
+    async def _dispatch_tool_call(
+        self,
+        tool_name: str,
+        raw_arguments: Any,
+        context: Dict[str, Any],
+        invoke_agent: Callable[[str, str, Dict], Coroutine[Any, Any, Any]],
+        send_status_update: Callable,
+    ) -> Any:
+        """Executes a single tool call from the LLM and returns its result."""
+        tool_args = loads_tool_arguments(raw_arguments)
+
+        logger.info(
+            "SlideDesigner is calling tool '{}' with args: {}", tool_name, tool_args
+        )
+
+        if tool_name == "invoke_agent":
+            # Special handling for inter-agent communication
+            agent_to_call = tool_args.get("agent_name")
+            agent_objective = tool_args.get("objective")
+            await send_status_update(
+                "AGENT_STATUS_UPDATE",
+                f"Asking the {agent_to_call} for help...",
+                {"status": "INVOKING_AGENT", "target_agent": agent_to_call},
+            )
+            async with self._agent_invocation_slots:
+                return await invoke_agent(agent_to_call, agent_objective, context)
+
+        # Workspace tools run one at a time in dispatch order. The lock is taken before
+        # the first await, so concurrently dispatched calls cannot overtake each other.
+        async with self._workspace_lock:
+            tool_function = self.available_functions.get(tool_name)
+            if not tool_function:
+                return {
+                    "status": "failed",
+                    "error": f"Internal error: Tool '{tool_name}' is not implemented.",
+                }
+            # We pass the context so tools can append commands directly
+            await send_status_update(
+                "AGENT_STATUS_UPDATE",
+                f"Using the tool {tool_name}...",
+                {"status": "INVOKING_TOOL", "target_tool": tool_name},
+            )
+            return await tool_function(context=context, **tool_args)
+
     # --- Tool Implementations ---
     # These methods now just create elements and append commands to the shared context.
 
@@ -269,7 +347,7 @@ class SlideDesigner(Agent):
         )  # Make it a slide
 
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"frame_id": frame_id, "status": "success"}
 
@@ -337,7 +415,7 @@ class SlideDesigner(Agent):
 
         element = self._workspace.create_element_from_payload(payload)
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
 
@@ -376,6 +454,6 @@ class SlideDesigner(Agent):
             return {"status": "failed", "error": error_msg}
 
         context["commands"].append(
-            {"type": "ELEMENT_CREATED", "payload": element.model_dump()}
+            {"type": "ELEMENT_CREATED", "payload": ElementAdapter.dump_python(element)}
         )
         return {"element_id": element.id, "status": "success"}
@@ -0,0 +1,69 @@
+# backend/app/agents/streaming.py
+from typing import Any, Callable, Dict, List
+
+
+async def consume_tool_call_stream(
+    response: Any,
+    on_calls_completed: Callable[[List[Dict[str, Any]], int], None],
+) -> Dict[str, Any]:
+    """
+    Assembles a streamed assistant message from its deltas. Tool call deltas are
+    merged by index. Whenever the stream moves on to a new index, every earlier call
+    is complete and `on_calls_completed(tool_calls, up_to)` is invoked, so callers can
+    start executing `tool_calls[:up_to]` while the rest of the message still streams.
+    It is invoked once more for all calls when the message ends.
+    Reading stops at the first finish reason, so a final turn without tool calls
+    returns without waiting for trailing chunks.
+    Returns the assistant message in the dict form accepted by `messages`.
+    """
+    content_parts: List[str] = []
+    tool_calls: List[Dict[str, Any]] = []
+
+    try:
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+            for tool_call_delta in delta.tool_calls or []:
+                index = tool_call_delta.index
+                if index is None:
+                    index = max(len(tool_calls) - 1, 0)
+                if index >= len(tool_calls):
+                    # A new tool call has started, so every earlier one is complete.
+                    on_calls_completed(tool_calls, len(tool_calls))
+                    tool_calls.extend(
+                        {
+                            "id": None,
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        }
+                        for _ in range(index + 1 - len(tool_calls))
+                    )
+                tool_call = tool_calls[index]
+                if tool_call_delta.id:
+                    tool_call["id"] = tool_call_delta.id
+                function_delta = tool_call_delta.function
+                if function_delta is not None:
+                    function = tool_call["function"]
+                    if function_delta.name:
+                        function["name"] = function_delta.name
+                    if function_delta.arguments:
+                        function["arguments"] += function_delta.arguments
+            if chunk.choices[0].finish_reason:
+                # The message is complete; stop reading instead of waiting for
+                # trailing chunks (usage, end-of-stream marker).
+                break
+        on_calls_completed(tool_calls, len(tool_calls))
+    finally:
+        # Release the underlying HTTP stream, which may be left unconsumed.
+        aclose = getattr(response, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    return {
+        "role": "assistant",
+        "content": "".join(content_parts) or None,
+        "tool_calls": tool_calls,
+    }
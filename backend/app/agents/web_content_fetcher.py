@@ -1,6 +1,7 @@
 import httpx
 from bs4 import BeautifulSoup
 from loguru import logger
+from functools import cached_property
 from typing import Dict, Any, List, Callable, Coroutine
 
 from .models import Agent
@@ -15,7 +16,7 @@ class WebContentFetcher(Agent):
     def name(self) -> str:
         return "WebContentFetcher"
 
-    @property
+    @cached_property
     def description(self) -> Dict[str, str]:
         return {
             "purpose": "Extracts the primary text content from a single public webpage URL. It's effective for articles and blog posts.",
@@ -1,9 +1,11 @@
 import json
 import asyncio
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi.websockets import WebSocketState
 from typing import List, Dict, Any
 from loguru import logger
 
+from ...models.elements import ElementAdapter, ElementListAdapter
 from ...services.workspace_service import WorkspaceService
 from ...services.agent_service import AgentService
 from .dependencies import get_workspace_service, get_agent_service
@@ -37,6 +39,30 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# Statuses that are wrapped into an AGENT_STATUS_UPDATE message for the client.
+_AGENT_STATUS_EVENTS = frozenset(
+    {
+        "STARTED",
+        "PLANNING",
+        "PLAN_CREATED",
+        "EXECUTING_TASK",
+        "INVOKING_AGENT",
+        "INVOKING_TOOL",
+        "COMPLETED",
+        "FAILED",
+        "ERROR",
+    }
+)
+
+
+def _elements_updated_message(elements) -> str:
+    """
+    Encodes an ELEMENTS_UPDATED message with the element list serialized straight to
+    JSON by pydantic, instead of dumping to dicts first and then through json.dumps.
+    """
+    payload = ElementListAdapter.dump_json(elements).decode()
+    return f'{{"type": "ELEMENTS_UPDATED", "payload": {payload}}}'
+
 
 @router.websocket("/ws")
 async def websocket_endpoint(
@@ -52,9 +78,11 @@ async def websocket_endpoint(
     # --- This `send_status_update` closure is the key communicator ---
     async def send_update_to_client(status, message, details=None):
         """A closure that captures the current websocket to send messages."""
-        if status in [
-            "STARTED", "PLANNING", "PLAN_CREATED", "EXECUTING_TASK", "INVOKING_AGENT", "INVOKING_TOOL", "COMPLETED", "FAILED", "ERROR"
-        ]:
+        # Agents keep reporting progress after the client has gone away; without a
+        # listener there is nothing to build or send.
+        if websocket.client_state != WebSocketState.CONNECTED:
+            return
+        if status in _AGENT_STATUS_EVENTS:
             payload = {
                 "type": "AGENT_STATUS_UPDATE",
                 "payload": {
@@ -88,7 +116,7 @@ async def websocket_endpoint(
             logger.debug(f"Received message: {message}")
             msg_type = message.get("type")
             payload = message.get("payload", {})
-            response = None  # Reset response for each message
+            response = None  # Encoded message to broadcast, reset for each message
 
             # --- ONE-SHOT AI PROMPT ---
             if msg_type == "user_prompt":
@@ -129,25 +157,29 @@ async def websocket_endpoint(
             elif msg_type == "undo":
                 restored_elements = workspace.undo()
                 if restored_elements is not None:
-                    response = {
-                        "type": "WORKSPACE_RESET",
-                        "payload": {
-                            "elements": [
-                                el.model_dump() for el in restored_elements.values()
-                            ]
-                        },
-                    }
+                    response = json.dumps(
+                        {
+                            "type": "WORKSPACE_RESET",
+                            "payload": {
+                                "elements": ElementListAdapter.dump_python(
+                                    list(restored_elements.values())
+                                )
+                            },
+                        }
+                    )
             elif msg_type == "redo":
                 restored_elements = workspace.redo()
                 if restored_elements is not None:
-                    response = {
-                        "type": "WORKSPACE_RESET",
-                        "payload": {
-                            "elements": [
-                                el.model_dump() for el in restored_elements.values()
-                            ]
-                        },
-                    }
+                    response = json.dumps(
+                        {
+                            "type": "WORKSPACE_RESET",
+                            "payload": {
+                                "elements": ElementListAdapter.dump_python(
+                                    list(restored_elements.values())
+                                )
+                            },
+                        }
+                    )
 
             # === ELEMENT MODIFICATION COMMANDS ===
             elif msg_type == "update_element":
@@ -156,26 +188,27 @@ async def websocket_endpoint(
                     payload["id"], payload, commit_history=commit_history
                 )
                 if element:
-                    response = {
-                        "type": "ELEMENT_UPDATED",
-                        "payload": element.model_dump(),
-                    }
+                    response = json.dumps(
+                        {
+                            "type": "ELEMENT_UPDATED",
+                            "payload": ElementAdapter.dump_python(element),
+                        }
+                    )
 
             elif msg_type == "create_element":
                 element = workspace.create_element_from_payload(payload)
                 if element:
-                    response = {
-                        "type": "ELEMENT_CREATED",
-                        "payload": element.model_dump(),
-                    }
+                    response = json.dumps(
+                        {
+                            "type": "ELEMENT_CREATED",
+                            "payload": ElementAdapter.dump_python(element),
+                        }
+                    )
 
             elif msg_type == "create_elements_batch":
                 elements = workspace.create_elements_batch(payload.get("elements", []))
                 if elements:
-                    response = {
-                        "type": "ELEMENTS_UPDATED",
-                        "payload": [el.model_dump() for el in elements],
-                    }
+                    response = _elements_updated_message(elements)
 
             elif msg_type == "delete_element":
                 deleted_ids = workspace.delete_element(payload["id"])
@@ -191,22 +224,12 @@ async def websocket_endpoint(
             elif msg_type == "group_elements":
                 elements = workspace.group_elements(payload["ids"])
                 if elements:
-                    response = {
-                        "type": "ELEMENTS_UPDATED",
-                        "payload": [el.model_dump() for el in elements],
-                    }
+                    response = _elements_updated_message(elements)
 
             elif msg_type == "ungroup_element":
                 children, deleted_ids = workspace.ungroup_elements(payload["id"])
                 if children:
-                    await manager.broadcast(
-                        json.dumps(
-                            {
-                                "type": "ELEMENTS_UPDATED",
-                                "payload": [el.model_dump() for el in children],
-                            }
-                        )
-                    )
+                    await manager.broadcast(_elements_updated_message(children))
                 for an_id in deleted_ids:
                     await manager.broadcast(
                         json.dumps(
@@ -220,40 +243,28 @@ async def websocket_endpoint(
                     payload["childId"], payload["newParentId"]
                 )
                 if elements:
-                    response = {
-                        "type": "ELEMENTS_UPDATED",
-                        "payload": [el.model_dump() for el in elements],
-                    }
+                    response = _elements_updated_message(elements)
 
             elif msg_type == "reorder_element":
                 elements = workspace.reorder_element(payload["id"], payload["command"])
                 if elements:
-                    response = {
-                        "type": "ELEMENTS_UPDATED",
-                        "payload": [el.model_dump() for el in elements],
-                    }
+                    response = _elements_updated_message(elements)
 
             # === PRESENTATION COMMANDS ===
             elif msg_type == "update_presentation_order":
                 elements = workspace.update_presentation_order(payload)
                 if elements:
-                    response = {
-                        "type": "ELEMENTS_UPDATED",
-                        "payload": [el.model_dump() for el in elements],
-                    }
+                    response = _elements_updated_message(elements)
 
             elif msg_type == "reorder_slide":
                 slides = workspace.reorder_slide(
                     payload["dragged_id"], payload["target_id"], payload["position"]
                 )
                 if slides:
-                    response = {
-                        "type": "ELEMENTS_UPDATED",
-                        "payload": [el.model_dump() for el in slides],
-                    }
+                    response = _elements_updated_message(slides)
 
             if response:
-                await manager.broadcast(json.dumps(response))
+                await manager.broadcast(response)
 
     except WebSocketDisconnect:
         logger.info(f"Client disconnected cleanly: {client_host}:{client_port}")
@@ -0,0 +1,55 @@
+# parsec-backend/app/core/cache.py
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Generic, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+def digest_key(*parts: str) -> str:
+    """Hashes the parts of a cache key (prompts, serialized context) into a short key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class TTLCache(Generic[V]):
+    """
+    A small in-process LRU cache whose entries expire `ttl_seconds` after they were
+    stored. The least recently used entry is evicted once `max_size` is exceeded; a
+    `max_size` of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        # Key -> (expiry on the monotonic clock, value), in least recently used order.
+        self._entries: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: V) -> None:
+        if self._max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self._ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._entries.pop(key, None)
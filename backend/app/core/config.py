@@ -29,6 +29,35 @@ class Settings(BaseSettings):
     AZURE_API_BASE_DALLE: str
     AZURE_API_VERSION_DALLE: str
 
+    # --- LLM HTTP CLIENT SETTINGS ---
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    LLM_HTTP_TIMEOUT: float = 60.0
+    # Upper bound on text completion requests in flight across all agents, and the
+    # number of times a failed (e.g. rate limited) request is retried.
+    LLM_MAX_CONCURRENT_COMPLETIONS: int = 16
+    LLM_NUM_RETRIES: int = 2
+
+    # --- AGENT SETTINGS ---
+    # When enabled, elements built from LLM tool arguments that the tool schema
+    # already constrains are constructed without running Pydantic validation.
+    TRUST_LLM_TOOL_ARGS: bool = False
+    # Upper bound on sub-agent invocations an agent runs concurrently within a turn.
+    MAX_CONCURRENT_AGENT_INVOCATIONS: int = 8
+    # Number of most recent workflow steps embedded in agent system prompts.
+    PROMPT_HISTORY_LIMIT: int = 8
+    # Token budget for that history; the oldest steps are dropped to fit. 0 disables it.
+    PROMPT_HISTORY_TOKEN_BUDGET: int = 6000
+    # CanvasAgent replays the tool calls of a previously completed, identical task
+    # (same objective and context) instead of asking the LLM again. 0 disables it.
+    CANVAS_PLAN_CACHE_SIZE: int = 512
+    CANVAS_PLAN_CACHE_TTL_SECONDS: float = 900.0
+    # ContentCrafter returns the content it crafted for an identical objective within
+    # the TTL instead of asking the LLM again, so repeating an objective yields the
+    # same text until the entry expires. 0 disables it.
+    CONTENT_CACHE_SIZE: int = 128
+    CONTENT_CACHE_TTL_SECONDS: float = 600.0
+
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: str = "minio"
     MINIO_SECRET_KEY: str = "minio123"
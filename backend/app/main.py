@@ -1,6 +1,7 @@
 # backend/app/main.py (Final, Corrected Version)
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
+import httpx
 import litellm
 from loguru import logger
 from fastapi.middleware.cors import CORSMiddleware
@@ -41,12 +42,26 @@ async def lifespan(app: FastAPI):
     litellm.model_list = model_configurations
     litellm.set_verbose = False
 
+    # A single pooled HTTP client is shared by every LiteLLM call, so the agents'
+    # reasoning loops reuse warm connections to Azure instead of re-negotiating TLS.
+    llm_http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=settings.LLM_HTTP_TIMEOUT,
+    )
+    litellm.aclient_session = llm_http_client
+
     logger.success(
         f"LiteLLM configured successfully for models: {[m['model_name'] for m in litellm.model_list]}"
     )
 
     yield
     logger.info("Application shutdown.")
+    litellm.aclient_session = None
+    await llm_http_client.aclose()
 
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
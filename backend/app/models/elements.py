@@ -1,5 +1,5 @@
 # parsec-backend/app/models/elements.py
-from pydantic import BaseModel, Field, conlist
+from pydantic import BaseModel, Field, TypeAdapter, conlist
 from typing import Literal, Optional, List, Union, Dict, Any
 from typing_extensions import Annotated
 import uuid
@@ -187,3 +187,8 @@ AnyElement = Union[
     ImageElement,
     ComponentInstanceElement,  # <-- ADDED
 ]
+
+# Prebuilt serializers for canvas elements. Dumping through a cached adapter avoids
+# per-instance model_dump() dispatch, and a whole list is serialized in one pass.
+ElementAdapter = TypeAdapter(AnyElement)
+ElementListAdapter = TypeAdapter(List[AnyElement])
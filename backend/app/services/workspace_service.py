@@ -15,6 +15,7 @@ from ..models.elements import (
     ComponentInstanceElement,
     ComponentProperty,
     Asset,
+    ElementListAdapter,
 )
 
 
@@ -25,6 +26,9 @@ class WorkspaceService:
         self.component_definitions: Dict[str, ComponentDefinition] = {}
         self.assets: Dict[str, Asset] = {}
         self._next_z_index = 1
+        # Incremented on every mutation of `elements`, so readers can cheaply tell
+        # whether a snapshot they built earlier is still current.
+        self.revision: int = 0
 
         # --- HISTORY MANAGEMENT STATE ---
         self.history: List[Dict[str, AnyElement]] = []
@@ -59,6 +63,7 @@ class WorkspaceService:
             self.history_index -= 1
             restored_state = self.history[self.history_index]
             self.elements = copy.deepcopy(restored_state)
+            self.revision += 1
             logger.info(
                 f"Undo successful. Restored history state at index {self.history_index}."
             )
@@ -72,6 +77,7 @@ class WorkspaceService:
             self.history_index += 1
             restored_state = self.history[self.history_index]
             self.elements = copy.deepcopy(restored_state)
+            self.revision += 1
             logger.info(
                 f"Redo successful. Restored history state at index {self.history_index}."
             )
@@ -121,32 +127,66 @@ class WorkspaceService:
         self, element_id: str, updates: Dict, commit_history: bool = True
     ) -> Optional[AnyElement]:
         """Updates an element. `commit_history=False` debounces rapid events like dragging."""
-        element = self.elements.get(element_id)
-        if not element:
+        updated_element = self._update_element_internal(element_id, updates)
+        if not updated_element:
             return None
 
-        updated_data = element.model_dump()
-        updated_data.update(updates)
-        updated_element = type(element)(**updated_data)
-        self.elements[element_id] = updated_element
-
         if commit_history:
             self._commit_history()
 
         return updated_element
 
-    def create_element_from_payload(self, payload: Dict) -> Optional[AnyElement]:
-        """Public method to create a single element."""
-        element = self._create_element_internal(payload)
+    def update_elements_bulk(
+        self, updates: List[Dict], commit_history: bool = True
+    ) -> List[AnyElement]:
+        """
+        Applies several element updates as a single mutation. Each entry must carry
+        the target element's `id` alongside the properties to change. History is
+        committed once for the whole batch instead of once per element.
+        The batch is all-or-nothing: every updated element is validated before any
+        of them is stored, so an invalid entry raises without leaving earlier entries
+        applied.
+        """
+        # Entries for the same element are merged in order, as if applied one by one.
+        merged_updates: Dict[str, Dict] = {}
+        for update in updates:
+            merged_updates.setdefault(update.get("id"), {}).update(update)
+        updated_elements = [
+            el
+            for element_id, update in merged_updates.items()
+            if (el := self._merge_element_update(element_id, update))
+        ]
+        for updated_element in updated_elements:
+            self.elements[updated_element.id] = updated_element
+            self.revision += 1
+        if updated_elements and commit_history:
+            self._commit_history()
+        return updated_elements
+
+    def create_element_from_payload(
+        self, payload: Dict, validate: bool = True
+    ) -> Optional[AnyElement]:
+        """
+        Public method to create a single element. `validate=False` skips Pydantic
+        validation for payloads built from already-trusted, well-typed values.
+        """
+        element = self._create_element_internal(payload, validate)
         if element:
             self._commit_history()
             return element
         return None
 
-    def create_elements_batch(self, payloads: List[Dict]) -> List[AnyElement]:
-        """Public method to create a batch of elements (for paste)."""
+    def create_elements_batch(
+        self, payloads: List[Dict], validate: bool = True
+    ) -> List[AnyElement]:
+        """
+        Public method to create a batch of elements (for paste and compound patterns).
+        `validate` is applied to every payload as in `create_element_from_payload`.
+        """
         created_elements = [
-            el for payload in payloads if (el := self._create_element_internal(payload))
+            el
+            for payload in payloads
+            if (el := self._create_element_internal(payload, validate))
         ]
         if created_elements:
             self._commit_history()
@@ -198,6 +238,29 @@ class WorkspaceService:
             self._commit_history()
         return affected_elements
 
+    def reorder_elements_bulk(
+        self, element_ids: List[str], command: str
+    ) -> List[AnyElement]:
+        """
+        Applies one z-order command to several elements at once. Elements are
+        reordered within their own parent, keeping their relative order, and each
+        affected z-order scope is sorted and renumbered a single time.
+        """
+        targets_by_parent: Dict[Optional[str], List[AnyElement]] = {}
+        for element_id in dict.fromkeys(element_ids):
+            element = self.elements.get(element_id)
+            if element:
+                targets_by_parent.setdefault(element.parentId, []).append(element)
+
+        affected_elements: Dict[str, AnyElement] = {}
+        for parent_id, targets in targets_by_parent.items():
+            for element in self._reorder_elements_internal(parent_id, targets, command):
+                affected_elements[element.id] = element
+
+        if affected_elements:
+            self._commit_history()
+        return list(affected_elements.values())
+
     def update_presentation_order(self, payload: dict) -> List[AnyElement]:
         """Public method to update the presentation slide order."""
         affected_elements = self._update_presentation_order_internal(payload)
@@ -221,7 +284,7 @@ class WorkspaceService:
     # ===================================================================
 
     def get_all_elements(self) -> List[Dict]:
-        return [element.model_dump() for element in self.elements.values()]
+        return ElementListAdapter.dump_python(list(self.elements.values()))
 
     def get_all_component_definitions(self) -> List[Dict]:
         return [
@@ -257,13 +320,42 @@ class WorkspaceService:
     # INTERNAL HELPER METHODS (These DO NOT commit to history)
     # ===================================================================
 
+    def mark_modified(self) -> None:
+        """Records an in-place mutation of elements made outside this service."""
+        self.revision += 1
+
     def add_element(self, element: Element) -> None:
         """Helper to add an element and manage z-index."""
         element.zIndex = self._next_z_index
         self._next_z_index += 1
         self.elements[element.id] = element
+        self.revision += 1
 
-    def _create_element_internal(self, payload: Dict) -> Optional[AnyElement]:
+    def _update_element_internal(
+        self, element_id: str, updates: Dict
+    ) -> Optional[AnyElement]:
+        updated_element = self._merge_element_update(element_id, updates)
+        if not updated_element:
+            return None
+        self.elements[element_id] = updated_element
+        self.revision += 1
+        return updated_element
+
+    def _merge_element_update(
+        self, element_id: str, updates: Dict
+    ) -> Optional[AnyElement]:
+        """Builds the updated element without storing it."""
+        element = self.elements.get(element_id)
+        if not element:
+            return None
+        # Merge over the element's current field values instead of a full model_dump:
+        # nested models are passed through as instances rather than dumped to dicts
+        # and rebuilt, so only the updated fields are actually validated anew.
+        return type(element).model_validate({**dict(element), **updates})
+
+    def _create_element_internal(
+        self, payload: Dict, validate: bool = True
+    ) -> Optional[AnyElement]:
         element_type = payload.get("element_type")
         model_map = {
             "shape": ShapeElement,
@@ -277,7 +369,10 @@ class WorkspaceService:
         if not element_model:
             return None
         try:
-            new_element = element_model(**payload)
+            if validate:
+                new_element = element_model(**payload)
+            else:
+                new_element = element_model.model_construct(**payload)
             self.add_element(new_element)
             return new_element
         except Exception as e:
@@ -300,6 +395,7 @@ class WorkspaceService:
         deleted_ids = [an_id for an_id in ids_to_delete if an_id in self.elements]
         for an_id in deleted_ids:
             del self.elements[an_id]
+        self.revision += 1
         return deleted_ids
 
     def _group_elements_internal(
@@ -322,6 +418,7 @@ class WorkspaceService:
             child.parentId = group.id
             child.x -= group.x
             child.y -= group.y
+        self.revision += 1
         return group, children
 
     def _ungroup_elements_internal(
@@ -331,6 +428,7 @@ class WorkspaceService:
         if not container or container.element_type not in ["group", "frame"]:
             return [], []
         children = [el for el in self.elements.values() if el.parentId == container_id]
+        self.revision += 1
         if not children:
             del self.elements[container_id]
             return [], [container_id]
@@ -361,6 +459,7 @@ class WorkspaceService:
         child.parentId = new_parent_id
         child.zIndex = self._next_z_index
         self._next_z_index += 1
+        self.revision += 1
         return [child]
 
     def _get_absolute_coords(self, element: Element) -> Tuple[float, float]:
@@ -391,10 +490,12 @@ class WorkspaceService:
             all_elements.insert(0, target_element)
         else:
             return []
+        previous_z = {el.id: el.zIndex for el in all_elements}
         for i, element in enumerate(all_elements):
             element.zIndex = i
+        self.revision += 1
         self._next_z_index = len(all_elements)
-        return all_elements
+        return [el for el in all_elements if el.zIndex != previous_z[el.id]]
 
     def _reorder_siblings(
         self, target_element: AnyElement, command: str
@@ -420,10 +521,60 @@ class WorkspaceService:
             return []
         parent = self.elements.get(target_element.parentId)
         base_z = parent.zIndex + 1 if parent else 0
+        previous_z = {el.id: el.zIndex for el in siblings}
         for i, sibling in enumerate(siblings):
             sibling.zIndex = base_z + i
+        self.revision += 1
         self._next_z_index = max(self._next_z_index, base_z + len(siblings))
-        return siblings
+        return [el for el in siblings if el.zIndex != previous_z[el.id]]
+
+    def _reorder_elements_internal(
+        self, parent_id: Optional[str], targets: List[AnyElement], command: str
+    ) -> List[AnyElement]:
+        # Top-level elements share the global z-order, nested ones their siblings'.
+        scope = sorted(
+            (
+                el
+                for el in self.elements.values()
+                if parent_id is None or el.parentId == parent_id
+            ),
+            key=lambda el: el.zIndex,
+        )
+        target_ids = {el.id for el in targets}
+        if command == "BRING_TO_FRONT":
+            scope = [el for el in scope if el.id not in target_ids] + [
+                el for el in scope if el.id in target_ids
+            ]
+        elif command == "SEND_TO_BACK":
+            scope = [el for el in scope if el.id in target_ids] + [
+                el for el in scope if el.id not in target_ids
+            ]
+        elif command == "BRING_FORWARD":
+            # Walk from the top so adjacent targets move up together.
+            for i in range(len(scope) - 2, -1, -1):
+                if scope[i].id in target_ids and scope[i + 1].id not in target_ids:
+                    scope[i], scope[i + 1] = scope[i + 1], scope[i]
+        elif command == "SEND_BACKWARD":
+            for i in range(1, len(scope)):
+                if scope[i].id in target_ids and scope[i - 1].id not in target_ids:
+                    scope[i], scope[i - 1] = scope[i - 1], scope[i]
+        else:
+            return []
+
+        previous_z = {el.id: el.zIndex for el in scope}
+        if parent_id is None:
+            for i, element in enumerate(scope):
+                element.zIndex = i
+            self._next_z_index = len(scope)
+        else:
+            parent = self.elements.get(parent_id)
+            base_z = parent.zIndex + 1 if parent else 0
+            for i, element in enumerate(scope):
+                element.zIndex = base_z + i
+            self._next_z_index = max(self._next_z_index, base_z + len(scope))
+        self.revision += 1
+        # Only elements whose z-index actually moved need to be sent to clients.
+        return [el for el in scope if el.zIndex != previous_z[el.id]]
 
     def _update_presentation_order_internal(self, payload: dict) -> List[AnyElement]:
         action = payload.get("action")
@@ -459,6 +610,8 @@ class WorkspaceService:
                 elif element.presentationOrder is not None:
                     element.presentationOrder = None
                     elements_to_broadcast.append(element)
+        if elements_to_broadcast:
+            self.revision += 1
         return elements_to_broadcast
 
     def _reorder_slide_internal(